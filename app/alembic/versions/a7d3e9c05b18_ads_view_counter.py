@@ -0,0 +1,26 @@
+"""Add view counter to advertisement
+
+Revision ID: a7d3e9c05b18
+Revises: f1b4d8a26c57
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e9c05b18'
+down_revision: Union[str, None] = 'f1b4d8a26c57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('advertisement', sa.Column('views', sa.BigInteger(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('advertisement', 'views')
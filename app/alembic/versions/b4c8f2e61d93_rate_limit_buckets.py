@@ -0,0 +1,35 @@
+"""Add shared rate limit buckets
+
+Revision ID: b4c8f2e61d93
+Revises: a7d3e9c05b18
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4c8f2e61d93'
+down_revision: Union[str, None] = 'a7d3e9c05b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'rate_limit_bucket',
+        sa.Column('key', sa.String(length=200), nullable=False),
+        sa.Column('tokens', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+        prefixes=['UNLOGGED'],
+    )
+    op.create_index(op.f('ix_rate_limit_bucket_updated_at'), 'rate_limit_bucket', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_rate_limit_bucket_updated_at'), table_name='rate_limit_bucket')
+    op.drop_table('rate_limit_bucket')
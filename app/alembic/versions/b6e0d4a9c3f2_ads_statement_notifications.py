@@ -0,0 +1,115 @@
+"""Notify about advertisement changes once per statement
+
+Revision ID: b6e0d4a9c3f2
+Revises: f3c8a1d6e947
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e0d4a9c3f2'
+down_revision: Union[str, None] = 'f3c8a1d6e947'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('DROP TRIGGER IF EXISTS advertisement_notify_update ON advertisement')
+    op.execute('DROP TRIGGER IF EXISTS advertisement_notify_insert_delete ON advertisement')
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_advertisement_change() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            ids integer[];
+            payload text;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT array_agg(id) INTO ids FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT array_agg(id) INTO ids FROM old_rows;
+            ELSE
+                -- Сброс счётчика просмотров не меняет version и событий не порождает
+                SELECT array_agg(n.id) INTO ids FROM new_rows n JOIN old_rows o ON o.id = n.id
+                WHERE n.version IS DISTINCT FROM o.version;
+            END IF;
+            IF ids IS NULL THEN
+                RETURN NULL;
+            END IF;
+            -- Больше 40 объявлений в 8000 байт не помещается — для крупных операций JSON не собираем
+            IF TG_OP <> 'DELETE' AND cardinality(ids) <= 40 THEN
+                SELECT json_build_object('op', lower(TG_OP), 'ads', json_agg(json_build_object(
+                    'title', title, 'description', description, 'price', price, 'id', id,
+                    'created_at', created_at, 'author_id', author_id, 'views', views, 'updated_at', updated_at
+                )))::text INTO payload FROM new_rows WHERE id = ANY(ids);
+                -- NOTIFY ограничен 8000 байтами
+                IF octet_length(payload) <= 7900 THEN
+                    PERFORM pg_notify('advertisement_changes', payload);
+                    RETURN NULL;
+                END IF;
+            END IF;
+            -- Иначе только id, по 500 в уведомлении (см. livefeed.AdFeed._on_notify)
+            FOR payload IN
+                SELECT json_build_object('op', lower(TG_OP), 'ids', json_agg(id ORDER BY id))::text
+                FROM (SELECT id, (row_number() OVER (ORDER BY id) - 1) / 500 AS part FROM unnest(ids) AS id) AS parts
+                GROUP BY part
+            LOOP
+                PERFORM pg_notify('advertisement_changes', payload);
+            END LOOP;
+            RETURN NULL;
+        END $$
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER advertisement_notify_insert AFTER INSERT ON advertisement "
+        "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_advertisement_change()"
+    )
+    op.execute(
+        "CREATE TRIGGER advertisement_notify_update AFTER UPDATE ON advertisement "
+        "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION notify_advertisement_change()"
+    )
+    op.execute(
+        "CREATE TRIGGER advertisement_notify_delete AFTER DELETE ON advertisement "
+        "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_advertisement_change()"
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER IF EXISTS advertisement_notify_delete ON advertisement')
+    op.execute('DROP TRIGGER IF EXISTS advertisement_notify_update ON advertisement')
+    op.execute('DROP TRIGGER IF EXISTS advertisement_notify_insert ON advertisement')
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_advertisement_change() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE payload text;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                payload := json_build_object('op', 'delete', 'id', OLD.id)::text;
+            ELSE
+                payload := json_build_object('op', lower(TG_OP), 'id', NEW.id, 'ad', json_build_object(
+                    'title', NEW.title, 'description', NEW.description, 'price', NEW.price, 'id', NEW.id,
+                    'created_at', NEW.created_at, 'author_id', NEW.author_id, 'views', NEW.views,
+                    'updated_at', NEW.updated_at
+                ))::text;
+                IF octet_length(payload) > 7900 THEN
+                    payload := json_build_object('op', lower(TG_OP), 'id', NEW.id)::text;
+                END IF;
+            END IF;
+            PERFORM pg_notify('advertisement_changes', payload);
+            RETURN NULL;
+        END $$
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER advertisement_notify_insert_delete AFTER INSERT OR DELETE ON advertisement "
+        "FOR EACH ROW EXECUTE FUNCTION notify_advertisement_change()"
+    )
+    op.execute(
+        "CREATE TRIGGER advertisement_notify_update AFTER UPDATE ON advertisement "
+        "FOR EACH ROW WHEN (OLD.version IS DISTINCT FROM NEW.version) EXECUTE FUNCTION notify_advertisement_change()"
+    )
@@ -0,0 +1,26 @@
+"""Add keyset pagination index on advertisement
+
+Revision ID: c3f1a9d2e7b4
+Revises: 4b395d5f7502
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f1a9d2e7b4'
+down_revision: Union[str, None] = '4b395d5f7502'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_advertisement_created_at_id', 'advertisement', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_advertisement_created_at_id', table_name='advertisement')
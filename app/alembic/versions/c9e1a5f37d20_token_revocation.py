@@ -0,0 +1,37 @@
+"""Add token revocation log
+
+Revision ID: c9e1a5f37d20
+Revises: b4c8f2e61d93
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e1a5f37d20'
+down_revision: Union[str, None] = 'b4c8f2e61d93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'token_revocation',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('token_digest', sa.LargeBinary(length=32), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('revoked_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['todo_user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_token_revocation_expires_at'), 'token_revocation', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_token_revocation_expires_at'), table_name='token_revocation')
+    op.drop_table('token_revocation')
@@ -0,0 +1,52 @@
+"""Add updated_at and deletion log for the ads changes feed
+
+Revision ID: d2f6b8a41c75
+Revises: c9e1a5f37d20
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f6b8a41c75'
+down_revision: Union[str, None] = 'c9e1a5f37d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('advertisement', sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+    op.execute('UPDATE advertisement SET updated_at = created_at WHERE created_at IS NOT NULL')
+    op.create_index('ix_advertisement_updated_at_id', 'advertisement', ['updated_at', 'id'], unique=False)
+
+    op.create_table(
+        'advertisement_deletion',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('ad_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_advertisement_deletion_deleted_at_id', 'advertisement_deletion', ['deleted_at', 'id'], unique=False
+    )
+    op.execute(
+        "CREATE OR REPLACE FUNCTION log_advertisement_deletion() RETURNS trigger LANGUAGE plpgsql AS $$ "
+        "BEGIN INSERT INTO advertisement_deletion (ad_id) SELECT id FROM deleted_rows; RETURN NULL; END $$"
+    )
+    op.execute(
+        "CREATE TRIGGER advertisement_deletion_log AFTER DELETE ON advertisement "
+        "REFERENCING OLD TABLE AS deleted_rows FOR EACH STATEMENT EXECUTE FUNCTION log_advertisement_deletion()"
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER IF EXISTS advertisement_deletion_log ON advertisement')
+    op.execute('DROP FUNCTION IF EXISTS log_advertisement_deletion()')
+    op.drop_index('ix_advertisement_deletion_deleted_at_id', table_name='advertisement_deletion')
+    op.drop_table('advertisement_deletion')
+    op.drop_index('ix_advertisement_updated_at_id', table_name='advertisement')
+    op.drop_column('advertisement', 'updated_at')
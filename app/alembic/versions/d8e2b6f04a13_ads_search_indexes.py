@@ -0,0 +1,49 @@
+"""Add full-text and trigram search indexes on advertisement
+
+Revision ID: d8e2b6f04a13
+Revises: c3f1a9d2e7b4
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8e2b6f04a13'
+down_revision: Union[str, None] = 'c3f1a9d2e7b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.add_column('advertisement', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    op.create_index('ix_advertisement_search_vector', 'advertisement', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index(
+        'ix_advertisement_title_trgm', 'advertisement', ['title'], unique=False,
+        postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'},
+    )
+    op.create_index(
+        'ix_advertisement_description_trgm', 'advertisement', ['description'], unique=False,
+        postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_advertisement_description_trgm', table_name='advertisement')
+    op.drop_index('ix_advertisement_title_trgm', table_name='advertisement')
+    op.drop_index('ix_advertisement_search_vector', table_name='advertisement')
+    op.drop_column('advertisement', 'search_vector')
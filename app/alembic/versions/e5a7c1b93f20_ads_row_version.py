@@ -0,0 +1,26 @@
+"""Add row version to advertisement
+
+Revision ID: e5a7c1b93f20
+Revises: d8e2b6f04a13
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c1b93f20'
+down_revision: Union[str, None] = 'd8e2b6f04a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('advertisement', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('advertisement', 'version')
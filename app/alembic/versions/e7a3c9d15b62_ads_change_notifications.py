@@ -0,0 +1,57 @@
+"""Notify listeners about advertisement changes
+
+Revision ID: e7a3c9d15b62
+Revises: d2f6b8a41c75
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3c9d15b62'
+down_revision: Union[str, None] = 'd2f6b8a41c75'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_advertisement_change() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE payload text;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                payload := json_build_object('op', 'delete', 'id', OLD.id)::text;
+            ELSE
+                payload := json_build_object('op', lower(TG_OP), 'id', NEW.id, 'ad', json_build_object(
+                    'title', NEW.title, 'description', NEW.description, 'price', NEW.price, 'id', NEW.id,
+                    'created_at', NEW.created_at, 'author_id', NEW.author_id, 'views', NEW.views,
+                    'updated_at', NEW.updated_at
+                ))::text;
+                IF octet_length(payload) > 7900 THEN
+                    payload := json_build_object('op', lower(TG_OP), 'id', NEW.id)::text;
+                END IF;
+            END IF;
+            PERFORM pg_notify('advertisement_changes', payload);
+            RETURN NULL;
+        END $$
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER advertisement_notify_insert_delete AFTER INSERT OR DELETE ON advertisement "
+        "FOR EACH ROW EXECUTE FUNCTION notify_advertisement_change()"
+    )
+    op.execute(
+        "CREATE TRIGGER advertisement_notify_update AFTER UPDATE ON advertisement "
+        "FOR EACH ROW WHEN (OLD.version IS DISTINCT FROM NEW.version) EXECUTE FUNCTION notify_advertisement_change()"
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER IF EXISTS advertisement_notify_update ON advertisement')
+    op.execute('DROP TRIGGER IF EXISTS advertisement_notify_insert_delete ON advertisement')
+    op.execute('DROP FUNCTION IF EXISTS notify_advertisement_change()')
@@ -0,0 +1,32 @@
+"""Index token lookups and cascade token deletes
+
+Revision ID: f1b4d8a26c57
+Revises: e5a7c1b93f20
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b4d8a26c57'
+down_revision: Union[str, None] = 'e5a7c1b93f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_token_creation_time'), 'token', ['creation_time'], unique=False)
+    op.create_index(op.f('ix_token_user_id'), 'token', ['user_id'], unique=False)
+    op.drop_constraint('token_user_id_fkey', 'token', type_='foreignkey')
+    op.create_foreign_key('token_user_id_fkey', 'token', 'todo_user', ['user_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    op.drop_constraint('token_user_id_fkey', 'token', type_='foreignkey')
+    op.create_foreign_key('token_user_id_fkey', 'token', 'todo_user', ['user_id'], ['id'])
+    op.drop_index(op.f('ix_token_user_id'), table_name='token')
+    op.drop_index(op.f('ix_token_creation_time'), table_name='token')
@@ -0,0 +1,28 @@
+"""Index advertisements by author for paginated "my ads"
+
+Revision ID: f3c8a1d6e947
+Revises: e7a3c9d15b62
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c8a1d6e947'
+down_revision: Union[str, None] = 'e7a3c9d15b62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_advertisement_author_id_created_at_id', 'advertisement', ['author_id', 'created_at', 'id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_advertisement_author_id_created_at_id', table_name='advertisement')
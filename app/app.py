@@ -1,14 +1,102 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from config import (
+    ADS_CHANGES_PURGE_INTERVAL, COMPRESSION_ENABLED, DB_REPLICA_DSNS, DB_REPLICA_HEALTH_INTERVAL, LIVE_FEED_ENABLED,
+    RATE_LIMIT_PURGE_INTERVAL, SQL_INSTRUMENTATION, TOKEN_PURGE_INTERVAL, TOKEN_REVOCATION_SYNC_INTERVAL,
+    VIEW_FLUSH_INTERVAL, WARMUP_TIMEOUT,
+)
+import auth
+import hashing
+import ratelimit
+from compression import CompressionMiddleware
+from counters import view_counter
+from db import engine
+from livefeed import ad_feed
+from instrumentation import SQLInstrumentationMiddleware, instrument
+from replicas import ReadYourWritesMiddleware, check_replicas, replicas
 from routes import router
+from tasks import purge_ad_deletions, purge_expired_tokens, purge_token_revocations, run_periodically
+from warmup import warm_up_until_ready
+
+logger = logging.getLogger(__name__)
+
+
+def start_background_tasks() -> list[asyncio.Task]:
+    tasks = []
+    if TOKEN_PURGE_INTERVAL:
+        tasks.append(asyncio.create_task(run_periodically(purge_expired_tokens, TOKEN_PURGE_INTERVAL)))
+        tasks.append(asyncio.create_task(run_periodically(purge_token_revocations, TOKEN_PURGE_INTERVAL)))
+    if TOKEN_REVOCATION_SYNC_INTERVAL:
+        tasks.append(asyncio.create_task(run_periodically(auth.sync_revocations, TOKEN_REVOCATION_SYNC_INTERVAL)))
+    if ADS_CHANGES_PURGE_INTERVAL:
+        tasks.append(asyncio.create_task(run_periodically(purge_ad_deletions, ADS_CHANGES_PURGE_INTERVAL)))
+    if replicas:
+        tasks.append(asyncio.create_task(run_periodically(check_replicas, DB_REPLICA_HEALTH_INTERVAL)))
+    if RATE_LIMIT_PURGE_INTERVAL and isinstance(ratelimit.backend, ratelimit.PostgresBackend):
+        tasks.append(asyncio.create_task(run_periodically(ratelimit.backend.purge, RATE_LIMIT_PURGE_INTERVAL)))
+    if LIVE_FEED_ENABLED:
+        tasks.append(asyncio.create_task(ad_feed.run()))
+    if VIEW_FLUSH_INTERVAL:
+        tasks.append(asyncio.create_task(run_periodically(view_counter.flush, VIEW_FLUSH_INTERVAL)))
+    return tasks
+
+
+async def stop_background_tasks(tasks: list[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # Несброшенные просмотры иначе потеряются вместе с воркером
+    try:
+        await view_counter.flush()
+    except Exception:
+        logger.exception("Final view counter flush failed")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Старт воркера: фоновые задачи и прогрев (пулы БД, горячие запросы, сериализаторы, bcrypt).
+    Старт ждёт прогрев не дольше WARMUP_TIMEOUT, дальше он продолжается в фоне;
+    /health/ready отвечает 200 только после его завершения.
+    """
+    app.state.ready = False
+    tasks = start_background_tasks()
+    warmup_task = asyncio.create_task(warm_up_until_ready(app))
+    await asyncio.wait({warmup_task}, timeout=WARMUP_TIMEOUT)
+    yield
+    app.state.ready = False
+    warmup_task.cancel()
+    await stop_background_tasks([warmup_task, *tasks])
+    hashing.shutdown()
+    await engine.dispose()
+    for replica in replicas:
+        await replica.engine.dispose()
+
 
 app = FastAPI(
     title="Adverstiment_services_api",
     version="1.0",
     description="Ads API",
+    lifespan=lifespan,
 )
 
 app.include_router(router)
 
+if SQL_INSTRUMENTATION:
+    instrument(engine)
+    app.add_middleware(SQLInstrumentationMiddleware)
+    for replica in replicas:
+        instrument(replica.engine)
+
+if DB_REPLICA_DSNS:
+    app.add_middleware(ReadYourWritesMiddleware)
+
+# Добавляется последним — внешний слой, сжимает уже готовый ответ
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware, cache_paths=("/ads/", "/ads/search"))
+
 # @app.on_event("startup")
 # async def startup():
 #     async with engine.begin() as conn:
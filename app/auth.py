@@ -1,20 +1,42 @@
-from bcrypt import checkpw, gensalt, hashpw
-from config import DEFAULT_ROLE
+import hashlib
+import time
+import hashing
+import statements
+from cache import TTLCache
+from config import (
+    DEFAULT_ROLE, PERMISSION_CACHE_SIZE, PERMISSION_CACHE_TTL, TOKEN_CACHE_SIZE, TOKEN_REVOCATION_SYNC_OVERLAP,
+)
+from db import async_session
 from fastapi import HTTPException
-from models import Right, Role, Token, User, user_roles, role_rights
+from models import Role, Token, TokenRevocation
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 import jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 
 
-def hash_password(password: str) -> str:
-    return hashpw(password.encode(), gensalt()).decode()
+async def hash_password(password: str) -> str:
+    return await hashing.hash_password(password)
 
 
-def check_password(password: str, hashed_password: str) -> bool:
-    return checkpw(password.encode(), hashed_password.encode())
+async def check_password(password: str, hashed_password: str) -> bool:
+    return await hashing.verify_password(password, hashed_password)
+
+
+# (user_id, model, write, read, only_own) -> bool
+permission_cache = TTLCache(maxsize=PERMISSION_CACHE_SIZE, ttl=PERMISSION_CACHE_TTL)
+
+
+def invalidate_permissions(user_id: int | None = None) -> None:
+    """
+    Сбрасывает кеш прав: для одного пользователя (смена его ролей)
+    или целиком (изменение ролей/прав).
+    """
+    if user_id is None:
+        permission_cache.clear()
+    else:
+        permission_cache.invalidate(lambda key, _: key[0] == user_id)
 
 
 async def check_access_rights(
@@ -28,32 +50,22 @@ async def check_access_rights(
 ) -> bool:
     """
     Проверяет права владельца токена на модель.
+    Результат кешируется; см. invalidate_permissions.
     """
-    where_args = [User.id == token.user_id, Right.model == model.__tablename__]
-    
-    if write:
-        where_args.append(Right.write.is_(True))
-    if read:
-        where_args.append(Right.read.is_(True))
-    
-    if hasattr(model, owner_field) and getattr(model, owner_field) != token.user_id:
-        where_args.append(Right.only_own.is_(False))
-    
-    rights_query = (
-        select(func.count(User.id))
-        .join(user_roles, user_roles.c.user_id == User.id)
-        .join(Role, Role.id == user_roles.c.role_id)
-        .join(role_rights, role_rights.c.role_id == Role.id)
-        .join(Right, Right.id == role_rights.c.right_id)
-        .where(*where_args)
-    )
-    
-    rights_count = (await session.execute(rights_query)).scalar()
-    
-    if not rights_count and raise_exception:
+    not_own = hasattr(model, owner_field) and getattr(model, owner_field) != token.user_id
+    cache_key = (token.user_id, model.__tablename__, write, read, not_own)
+    allowed = permission_cache.get(cache_key)
+
+    if allowed is None:
+        rights_query = statements.access_rights(write, read, not_own)
+        params = {"user_id": token.user_id, "model": model.__tablename__}
+        allowed = bool((await session.execute(rights_query, params)).scalar())
+        permission_cache.set(cache_key, allowed)
+
+    if not allowed and raise_exception:
         raise HTTPException(status_code=403, detail="Access denied")
-    
-    return rights_count > 0
+
+    return allowed
 
 
 async def get_default_role(session: AsyncSession) -> Role:
@@ -68,18 +80,132 @@ async def create_access_token(user_id: int) -> str:
     Создает JWT-токен с user_id.
     """
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    payload = {"sub": str(user_id), "exp": expire}
+    # iat с долями секунды: токен, выданный сразу после revoke_user_tokens, остаётся действительным
+    payload = {"sub": str(user_id), "iat": time.time(), "exp": expire}
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 
+# sha256(JWT) -> проверенный payload; запись живёт до exp токена
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+# sha256(JWT) отозванного токена -> его exp. Без ограничения размера: вытесненный отзыв
+# снова сделал бы токен действительным; устаревшие записи удаляет sync_revocations
+revoked_tokens: dict[bytes, float] = {}
+# user_id -> момент отзыва: токены, выданные раньше, недействительны
+revoked_users: dict[int, float] = {}
+# now() базы на момент последней синхронизации отзывов
+_synced_until: datetime | None = None
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+async def decode_access_token(token: str) -> dict:
+    """
+    Проверяет JWT-токен и возвращает его payload.
+    Проверенные токены кешируются до exp: повторный запрос с тем же токеном
+    не проверяет подпись и не разбирает payload заново.
+    """
+    digest = token_digest(token)
+    if digest in revoked_tokens:
+        raise HTTPException(status_code=401, detail="Token revoked")
+
+    payload = token_cache.get(digest)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token expired")
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        token_cache.set(digest, payload, ttl=payload["exp"] - time.time())
+
+    revoked_at = revoked_users.get(int(payload["sub"]))
+    if revoked_at is not None and payload.get("iat", 0) < revoked_at:
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return payload
+
+
 async def verify_access_token(token: str) -> int:
     """
     Проверяет JWT-токен и возвращает user_id.
     """
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return int(payload["sub"])
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    return int((await decode_access_token(token))["sub"])
+
+
+def _apply_revocation(revocation: TokenRevocation) -> bool:
+    """Применяет отзыв к кешам воркера; False, если он уже был применён."""
+    applied = False
+    if revocation.token_digest is not None and revocation.token_digest not in revoked_tokens:
+        revoked_tokens[revocation.token_digest] = revocation.expires_at.timestamp()
+        token_cache.pop(revocation.token_digest)
+        applied = True
+    revoked_at = revocation.revoked_at.timestamp()
+    if revocation.user_id is not None and revoked_users.get(revocation.user_id, 0) < revoked_at:
+        revoked_users[revocation.user_id] = revoked_at
+        token_cache.invalidate(lambda _, payload: int(payload["sub"]) == revocation.user_id)
+        applied = True
+    return applied
+
+
+async def revoke_token(session: AsyncSession, token: str) -> None:
+    """
+    Отзывает один токен (выход из системы).
+    """
+    payload = await decode_access_token(token)
+    revocation = TokenRevocation(
+        token_digest=token_digest(token),
+        revoked_at=datetime.now(timezone.utc),
+        expires_at=datetime.fromtimestamp(payload["exp"], timezone.utc),
+    )
+    session.add(revocation)
+    await session.commit()
+    _apply_revocation(revocation)
+
+
+async def revoke_user_tokens(session: AsyncSession, user_id: int) -> None:
+    """
+    Отзывает все выданные пользователю токены.
+    """
+    now = datetime.now(timezone.utc)
+    revocation = TokenRevocation(
+        user_id=user_id,
+        revoked_at=now,
+        expires_at=now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+    session.add(revocation)
+    await session.commit()
+    _apply_revocation(revocation)
+
+
+async def sync_revocations() -> int:
+    """
+    Подтягивает отзывы, сделанные другими воркерами, и забывает устаревшие.
+    Читаются записи с revoked_at не раньше прошлой синхронизации минус TOKEN_REVOCATION_SYNC_OVERLAP:
+    id и revoked_at назначаются до COMMIT, и запись, закоммиченная позже соседних, иначе была бы пропущена.
+    Уже применённые отзывы из перекрытия пропускаются. Возвращает число новых отзывов.
+    """
+    global _synced_until
+    query = select(TokenRevocation).where(TokenRevocation.expires_at > func.now())
+    if _synced_until is not None:
+        query = query.where(
+            TokenRevocation.revoked_at > _synced_until - timedelta(seconds=TOKEN_REVOCATION_SYNC_OVERLAP)
+        )
+    async with async_session() as session:
+        synced_until = await session.scalar(select(func.now()))
+        revocations = (await session.scalars(query)).all()
+    applied = sum(_apply_revocation(revocation) for revocation in revocations)
+    _synced_until = synced_until
+
+    now = time.time()
+    for digest in [digest for digest, expires_at in revoked_tokens.items() if expires_at <= now]:
+        del revoked_tokens[digest]
+    # Токены, выданные до отзыва, к этому времени уже истекли
+    horizon = now - ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    for user_id in [user_id for user_id, revoked_at in revoked_users.items() if revoked_at < horizon]:
+        del revoked_users[user_id]
+    return applied
+
+
+def token_stats() -> dict:
+    return {**token_cache.stats(), "revoked_tokens": len(revoked_tokens), "revoked_users": len(revoked_users)}
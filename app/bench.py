@@ -0,0 +1,250 @@
+"""
+Нагрузочный бенчмарк маршрутов API.
+
+Приложение поднимается в этом же процессе (httpx + ASGITransport) поверх
+отдельной локальной базы PostgreSQL, которая создаётся и заполняется заново.
+По каждому маршруту считаются p50/p95/p99, req/s и число SQL-запросов на запрос;
+результат сохраняется в JSON и может сравниваться с предыдущим прогоном.
+
+    python bench.py --ads 50000 --concurrency 32 --requests 2000 --output bench.json
+    python bench.py --baseline bench.json --threshold 0.2
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Route latency/throughput benchmark")
+    parser.add_argument("--database", default=os.getenv("BENCH_POSTGRES_DB", "rest_na_fast_bench"))
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--ads", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="requests per route")
+    parser.add_argument("--routes", nargs="*", help="run only these scenarios")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--baseline", help="previous results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p95 slowdown, 0.2 = 20%%")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+# База бенчмарка подменяет рабочую до импорта модулей приложения
+os.environ["POSTGRES_DB"] = ARGS.database
+# Все запросы бенчмарка идут с одного адреса — ограничитель частоты исказил бы замеры
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+import httpx  # noqa: E402
+from sqlalchemy import event, insert, text  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+import db as database  # noqa: E402
+from app import app  # noqa: E402
+from config import POSTGRES_HOST, POSTGRES_PASSWORD, POSTGRES_PORT, POSTGRES_USER  # noqa: E402
+from hashing import hash_password  # noqa: E402
+from models import Advertisement, Base, User  # noqa: E402
+
+if database.engine.url.database != ARGS.database:
+    # config уже был импортирован с другой базой — не трогаем рабочие данные
+    sys.exit(f"Refusing to run: engine points to {database.engine.url.database!r}, not {ARGS.database!r}")
+
+WORDS = ["велосипед", "диван", "ноутбук", "телефон", "куртка", "стол", "гитара", "самокат", "монитор", "кресло"]
+
+query_count = 0
+
+
+@event.listens_for(database.engine.sync_engine, "before_cursor_execute")
+def _count_queries(conn, cursor, statement, parameters, context, executemany):
+    global query_count
+    query_count += 1
+
+
+async def prepare_database() -> None:
+    """Пересоздаёт базу бенчмарка и заполняет её данными."""
+    admin = create_async_engine(
+        f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/postgres",
+        isolation_level="AUTOCOMMIT",
+    )
+    async with admin.connect() as conn:
+        await conn.execute(text(f'DROP DATABASE IF EXISTS "{ARGS.database}" WITH (FORCE)'))
+        await conn.execute(text(f'CREATE DATABASE "{ARGS.database}"'))
+    await admin.dispose()
+
+    async with database.engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await conn.run_sync(Base.metadata.create_all)
+
+    rnd = random.Random(ARGS.seed)
+    password = await hash_password("bench")
+    now = datetime.datetime.utcnow()
+    async with database.async_session() as session:
+        await session.execute(
+            insert(User), [{"name": f"seed_{i}", "password": password} for i in range(ARGS.users)]
+        )
+        user_ids = (await session.scalars(text("SELECT id FROM todo_user"))).all()
+        batch = []
+        for i in range(ARGS.ads):
+            batch.append({
+                "title": f"{rnd.choice(WORDS)} {rnd.choice(WORDS)} {i}",
+                "description": " ".join(rnd.choices(WORDS, k=12)),
+                "price": round(rnd.uniform(100, 100000), 2),
+                "author_id": rnd.choice(user_ids),
+                "created_at": now - datetime.timedelta(seconds=i),
+            })
+            if len(batch) == 5000:
+                await session.execute(insert(Advertisement), batch)
+                batch = []
+        if batch:
+            await session.execute(insert(Advertisement), batch)
+        await session.execute(text("ANALYZE"))
+        await session.commit()
+
+
+async def login(client: httpx.AsyncClient, name: str) -> dict:
+    await client.post("/users/register", json={"name": name, "password": "bench"})
+    response = await client.post("/users/login", json={"name": name, "password": "bench"})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def own_ad_ids(client: httpx.AsyncClient, auth: dict, count: int) -> list[int]:
+    ids = []
+    for start in range(0, count, 1000):
+        payload = [{"title": f"bench {i}", "price": i} for i in range(start, min(count, start + 1000))]
+        response = await client.post("/ads/bulk", json=payload, headers=auth)
+        response.raise_for_status()
+        ids.extend(item["id"] for item in response.json())
+    return ids
+
+
+async def build_scenarios(client: httpx.AsyncClient) -> dict:
+    """Сценарий — функция номера запроса, возвращающая (method, url, kwargs)."""
+    auth = await login(client, "bench_user")
+    ids = await own_ad_ids(client, auth, ARGS.requests * 2)
+    update_ids, delete_ids = ids[:ARGS.requests], ids[ARGS.requests:]
+    first_page = await client.get("/ads/")
+    cursor = first_page.headers.get("X-Next-Cursor", "")
+    max_id = ARGS.ads
+    run_id = uuid.uuid4().hex[:8]
+
+    return {
+        "GET /ads/": lambda i: ("GET", "/ads/", {}),
+        "GET /ads/?cursor": lambda i: ("GET", "/ads/", {"params": {"cursor": cursor}}),
+        "GET /ads/{id}": lambda i: ("GET", f"/ads/{1 + i * 7919 % max_id}", {}),
+        "GET /ads/search": lambda i: ("GET", "/ads/search", {"params": {"q": WORDS[i % len(WORDS)]}}),
+        "GET /roles/": lambda i: ("GET", "/roles/", {}),
+        "GET /users/me": lambda i: ("GET", "/users/me", {"headers": auth}),
+        "POST /ads/": lambda i: ("POST", "/ads/", {"headers": auth, "json": {"title": f"new {i}", "price": i}}),
+        "PUT /ads/{id}": lambda i: (
+            "PUT", f"/ads/{update_ids[i % len(update_ids)]}", {"headers": auth, "json": {"price": i}}
+        ),
+        "DELETE /ads/{id}": lambda i: ("DELETE", f"/ads/{delete_ids[i % len(delete_ids)]}", {"headers": auth}),
+        "POST /ads/bulk": lambda i: (
+            "POST", "/ads/bulk", {"headers": auth, "json": [{"title": f"bulk {i} {j}", "price": j} for j in range(50)]}
+        ),
+        "POST /users/login": lambda i: (
+            "POST", "/users/login", {"json": {"name": "bench_user", "password": "bench"}}
+        ),
+        "POST /users/register": lambda i: (
+            "POST", "/users/register", {"json": {"name": f"r_{run_id}_{i}", "password": "bench"}}
+        ),
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario) -> dict:
+    global query_count
+    latencies = []
+    errors = 0
+    counter = iter(range(ARGS.requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, url, kwargs = scenario(i)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    query_count = 0
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(ARGS.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(percentiles[49] * 1000, 3),
+        "p95_ms": round(percentiles[94] * 1000, 3),
+        "p99_ms": round(percentiles[98] * 1000, 3),
+        "queries_per_request": round(query_count / len(latencies), 2),
+    }
+
+
+def compare(results: dict, baseline_path: str) -> bool:
+    """Печатает изменение p95 относительно прошлого прогона; False при регрессии."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["routes"]
+    ok = True
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous["p95_ms"]:
+            continue
+        change = current["p95_ms"] / previous["p95_ms"] - 1
+        regressed = change > ARGS.threshold
+        ok &= not regressed
+        print(f"{name:<24} p95 {previous['p95_ms']:>9.2f} -> {current['p95_ms']:>9.2f} ms "
+              f"({change:+.0%}){'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+async def main() -> int:
+    await prepare_database()
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        scenarios = await build_scenarios(client)
+        for name, scenario in scenarios.items():
+            if ARGS.routes and name not in ARGS.routes:
+                continue
+            results[name] = await run_scenario(client, scenario)
+            r = results[name]
+            print(f"{name:<24} {r['rps']:>8} req/s  p50 {r['p50_ms']:>8.2f}  p95 {r['p95_ms']:>8.2f}  "
+                  f"p99 {r['p99_ms']:>8.2f} ms  {r['queries_per_request']:>5} q/req  {r['errors']} errors")
+    await database.engine.dispose()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "users": ARGS.users,
+            "ads": ARGS.ads,
+            "concurrency": ARGS.concurrency,
+            "requests_per_route": ARGS.requests,
+            "seed": ARGS.seed,
+        },
+        "routes": results,
+    }
+    with open(ARGS.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Results saved to {ARGS.output}")
+
+    if ARGS.baseline and not compare(results, ARGS.baseline):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
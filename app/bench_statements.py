@@ -0,0 +1,116 @@
+"""
+Микробенчмарк заранее собранных выражений (statements.py).
+
+Для каждого горячего запроса сравнивается сборка выражения на каждый вызов
+(как было раньше) и готовое выражение с bindparam. По умолчанию замеряется
+только работа SQLAlchemy на стороне Python: сборка конструкции, вычисление
+ключа кеша и поиск скомпилированного SQL в кеше — база не нужна.
+С --execute выражения ещё и выполняются в базе POSTGRES_DB (только чтение).
+
+    python bench_statements.py --iterations 20000
+    python bench_statements.py --execute 2000
+"""
+import argparse
+import asyncio
+import datetime
+import time
+import uuid
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.util import LRUCache
+
+import statements
+from db import async_session, engine
+from models import Advertisement, Right, Role, Token, User, role_rights, user_roles
+
+
+def inline_ad_by_id(ad_id):
+    return select(Advertisement).where(Advertisement.id == ad_id)
+
+
+def inline_token(token, since):
+    return select(Token).where(Token.token == token, Token.creation_time >= since)
+
+
+def inline_access_rights(user_id, model):
+    return (
+        select(func.count(User.id))
+        .join(user_roles, user_roles.c.user_id == User.id)
+        .join(Role, Role.id == user_roles.c.role_id)
+        .join(role_rights, role_rights.c.role_id == Role.id)
+        .join(Right, Right.id == role_rights.c.right_id)
+        .where(User.id == user_id, Right.model == model, Right.write.is_(True), Right.only_own.is_(False))
+    )
+
+
+def cases() -> dict:
+    """Имя запроса -> (сборка на каждый вызов, готовое выражение, параметры)"""
+    since = datetime.datetime.utcnow()
+    token = uuid.uuid4()
+    return {
+        "ad_by_id": (lambda: inline_ad_by_id(1), statements.AD_BY_ID, {"ad_id": 1}),
+        "token": (lambda: inline_token(token, since), statements.TOKEN_BY_VALUE, {"token": token, "since": since}),
+        "access_rights": (
+            lambda: inline_access_rights(1, "advertisement"),
+            statements.access_rights(True, False, True),
+            {"user_id": 1, "model": "advertisement"},
+        ),
+    }
+
+
+def per_call(fn, iterations: int) -> float:
+    """Среднее время вызова fn в микросекундах"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def bench_python(iterations: int) -> None:
+    dialect = postgresql.asyncpg.dialect()
+
+    def prepare(stmt, cache):
+        # То же, что делает Connection.execute до отправки запроса в драйвер
+        stmt._compile_w_cache(dialect, compiled_cache=cache, column_keys=[])
+
+    for name, (build, prebuilt, _) in cases().items():
+        cache = LRUCache(100)
+        inline = per_call(lambda: prepare(build(), cache), iterations)
+        ready = per_call(lambda: prepare(prebuilt, cache), iterations)
+        print(f"{name:<14} inline {inline:8.1f} us  prebuilt {ready:8.1f} us  saved {inline - ready:8.1f} us/query")
+
+
+async def bench_execute(iterations: int) -> None:
+    async with async_session() as session:
+        for name, (build, prebuilt, params) in cases().items():
+            await session.execute(build())
+            await session.execute(prebuilt, params)
+
+            started = time.perf_counter()
+            for _ in range(iterations):
+                (await session.execute(build())).all()
+            inline = (time.perf_counter() - started) / iterations * 1e6
+
+            started = time.perf_counter()
+            for _ in range(iterations):
+                (await session.execute(prebuilt, params)).all()
+            ready = (time.perf_counter() - started) / iterations * 1e6
+            print(f"{name:<14} inline {inline:8.1f} us  prebuilt {ready:8.1f} us  saved {inline - ready:8.1f} us/query")
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prebuilt statement micro-benchmark")
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--execute", type=int, metavar="N", help="also execute each query N times in the database")
+    args = parser.parse_args()
+
+    bench_python(args.iterations)
+    if args.execute:
+        print("-- with database round trip --")
+        asyncio.run(bench_execute(args.execute))
+
+
+if __name__ == "__main__":
+    main()
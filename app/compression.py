@@ -0,0 +1,268 @@
+"""
+Сжатие ответов по Accept-Encoding: zstd, br и gzip.
+
+gzip есть всегда (zlib); br и zstd — если установлены пакеты brotli и zstandard.
+Ответ целиком сжимается, если он не меньше COMPRESSION_MIN_SIZE; потоковые ответы
+(NDJSON, выгрузки) сжимаются по мере поступления, а сброс клиенту делается раз в
+COMPRESSION_STREAM_FLUSH_SIZE байт: сброс после каждого мелкого куска вдвое
+ухудшает сжатие. SSE не сжимается — события уходят сразу. Для анонимных GET
+страниц списков сжатое тело кешируется по URL вместе с исходным телом: пока
+страница не изменилась, она не сжимается заново.
+"""
+import asyncio
+import zlib
+from collections import Counter
+from typing import Callable, Iterable, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from cache import TTLCache
+from config import (
+    COMPRESSION_BROTLI_LEVEL, COMPRESSION_CACHE_MAX_BODY, COMPRESSION_CACHE_SIZE, COMPRESSION_CACHE_TTL,
+    COMPRESSION_GZIP_LEVEL, COMPRESSION_MIN_SIZE, COMPRESSION_OFFLOAD_SIZE, COMPRESSION_STREAM_FLUSH_SIZE,
+    COMPRESSION_ZSTD_LEVEL,
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/x-ndjson", "application/javascript", "application/xml", "image/svg+xml",
+}
+
+
+class GzipStream:
+    def __init__(self):
+        self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, wbits=31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_LEVEL)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdStream:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def _gzip(data: bytes) -> bytes:
+    compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, wbits=31)
+    return compressor.compress(data) + compressor.flush()
+
+
+# Кодировка -> (сжатие целого тела, потоковый компрессор); порядок — предпочтение сервера
+ENCODINGS: dict[str, tuple[Callable[[bytes], bytes], Callable]] = {}
+if zstandard is not None:
+    ENCODINGS["zstd"] = (zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compress, ZstdStream)
+if brotli is not None:
+    ENCODINGS["br"] = (lambda data: brotli.compress(data, quality=COMPRESSION_BROTLI_LEVEL), BrotliStream)
+ENCODINGS["gzip"] = (_gzip, GzipStream)
+
+
+def choose_encoding(accept_encoding: str, available: Iterable[str] = ENCODINGS) -> Optional[str]:
+    """Кодировка с наибольшим q из Accept-Encoding; при равных q — в порядке предпочтения сервера."""
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for name in available:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type == "text/event-stream":
+        # SSE — мелкие события и keepalive; прокси часто буферизуют сжатый поток
+        return False
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES or media_type.endswith("+json")
+
+
+# (path?query, кодировка) -> (исходное тело, сжатое тело)
+page_cache = TTLCache(maxsize=COMPRESSION_CACHE_SIZE, ttl=COMPRESSION_CACHE_TTL)
+compression_stats: Counter[str] = Counter()
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы, которые клиент согласен принять сжатыми.
+    cache_paths — пути, чьи анонимные GET-ответы кешируются уже сжатыми.
+    """
+
+    def __init__(self, app: ASGIApp, cache_paths: Iterable[str] = ()):
+        self.app = app
+        self.cache_paths = frozenset(cache_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not ENCODINGS:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        encoding = choose_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        cache_key = None
+        if scope["method"] == "GET" and scope["path"] in self.cache_paths and "authorization" not in headers:
+            cache_key = (scope["path"] + "?" + scope["query_string"].decode("latin-1"), encoding)
+        response = _CompressedResponse(encoding, cache_key, send)
+        await self.app(scope, receive, response.send_compressed)
+
+
+class _CompressedResponse:
+    """Состояние одного ответа: start-сообщение придерживается до первого куска тела."""
+
+    def __init__(self, encoding: str, cache_key: Optional[tuple], send: Send):
+        self.encoding = encoding
+        self.cache_key = cache_key
+        self.send = send
+        self.start: Optional[Message] = None
+        self.stream = None
+        # Сжатое, но ещё не отправленное, и сколько исходных байт в нём
+        self.pending: list[bytes] = []
+        self.unflushed = 0
+        self.passthrough = False
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            if (
+                message["status"] < 200 or message["status"] in (204, 304)
+                or "content-encoding" in headers
+                or not is_compressible(headers.get("content-type", ""))
+            ):
+                self.passthrough = True
+                await self.send(message)
+            else:
+                self.start = message
+            return
+        if self.passthrough or message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.stream is not None:
+            await self._send_streamed(body, more_body)
+            return
+
+        start, self.start = self.start, None
+        if not more_body:
+            await self._send_whole(start, body)
+            return
+        # Потоковый ответ: длина заранее не известна, сжимаем куски по мере поступления
+        self.stream = ENCODINGS[self.encoding][1]()
+        self._set_encoding_headers(start)
+        del MutableHeaders(scope=start)["content-length"]
+        compression_stats[f"{self.encoding}_streamed"] += 1
+        await self.send(start)
+        await self._send_streamed(body, True)
+
+    async def _send_streamed(self, body: bytes, more_body: bool) -> None:
+        if body:
+            self.pending.append(self.stream.compress(body))
+            self.unflushed += len(body)
+        if not more_body:
+            self.pending.append(self.stream.finish())
+        elif self.unflushed >= COMPRESSION_STREAM_FLUSH_SIZE:
+            self.pending.append(self.stream.flush())
+        else:
+            return
+        data, self.pending, self.unflushed = b"".join(self.pending), [], 0
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def _send_whole(self, start: Message, body: bytes) -> None:
+        if len(body) < COMPRESSION_MIN_SIZE:
+            MutableHeaders(scope=start).add_vary_header("Accept-Encoding")
+            await self.send(start)
+            await self.send({"type": "http.response.body", "body": body})
+            return
+        data = await self._compress(body, start["status"])
+        self._set_encoding_headers(start)
+        MutableHeaders(scope=start)["content-length"] = str(len(data))
+        await self.send(start)
+        await self.send({"type": "http.response.body", "body": data})
+
+    async def _compress(self, body: bytes, status: int) -> bytes:
+        cacheable = self.cache_key is not None and status == 200 and len(body) <= COMPRESSION_CACHE_MAX_BODY
+        if cacheable:
+            # Сравнение тел (memcmp) в десятки раз дешевле и хеширования, и сжатия
+            cached = page_cache.get(self.cache_key)
+            if cached is not None and cached[0] == body:
+                compression_stats["cache_hits"] += 1
+                return cached[1]
+        compress = ENCODINGS[self.encoding][0]
+        if len(body) >= COMPRESSION_OFFLOAD_SIZE:
+            # zlib, brotli и zstandard отпускают GIL — большое тело сжимаем вне event loop
+            data = await asyncio.to_thread(compress, body)
+        else:
+            data = compress(body)
+        compression_stats[self.encoding] += 1
+        compression_stats["bytes_in"] += len(body)
+        compression_stats["bytes_out"] += len(data)
+        if cacheable:
+            compression_stats["cache_misses"] += 1
+            page_cache.set(self.cache_key, (body, data))
+        return data
+
+    def _set_encoding_headers(self, start: Message) -> None:
+        headers = MutableHeaders(scope=start)
+        headers["content-encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        # Сжатое представление побайтно отличается от исходного — сильный ETag становится слабым
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["etag"] = "W/" + etag
+
+
+def get_stats() -> dict:
+    return {
+        "encodings": list(ENCODINGS),
+        "min_size": COMPRESSION_MIN_SIZE,
+        "cache_size": len(page_cache),
+        **compression_stats,
+    }
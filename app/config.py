@@ -1,6 +1,5 @@
 import os
 from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 load_dotenv()
 
@@ -14,13 +13,114 @@ PG_DSN = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HO
 
 
 TOKEN_TTL = int(os.getenv("TOKEN_TTL", 60))
+TOKEN_PURGE_INTERVAL = int(os.getenv("TOKEN_PURGE_INTERVAL", 300))  # 0 — не запускать очистку
+TOKEN_PURGE_BATCH = int(os.getenv("TOKEN_PURGE_BATCH", 1000))
+TOKEN_PURGE_PAUSE = float(os.getenv("TOKEN_PURGE_PAUSE", 0.1))
 
 SQL_DEBUG = os.getenv("SQL_DEBUG", "False").lower() in ("true", "1")
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "True").lower() in ("true", "1")
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", 10))
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", 3))
 DEFAULT_ROLE = os.getenv("DEFAULT_ROLE", "user")
 
 SECRET_KEY = os.getenv("SECRET_KEY", "qwerty")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
-engine = create_async_engine(PG_DSN, echo=True)
-async_session = async_sessionmaker(engine, expire_on_commit=False)
\ No newline at end of file
+ADS_PAGE_LIMIT = int(os.getenv("ADS_PAGE_LIMIT", 50))
+ADS_PAGE_MAX_LIMIT = int(os.getenv("ADS_PAGE_MAX_LIMIT", 500))
+ADS_STREAM_CHUNK_SIZE = int(os.getenv("ADS_STREAM_CHUNK_SIZE", 500))
+ADS_BULK_MAX = int(os.getenv("ADS_BULK_MAX", 1000))
+# Лента изменений не отдаёт изменения моложе ADS_CHANGES_SETTLE секунд и не заходит дальше начала
+# самой старой открытой транзакции базы: её строки появятся после COMMIT с updated_at из прошлого
+ADS_CHANGES_SETTLE = float(os.getenv("ADS_CHANGES_SETTLE", 5))
+ADS_CHANGES_RETENTION_DAYS = int(os.getenv("ADS_CHANGES_RETENTION_DAYS", 30))
+ADS_CHANGES_PURGE_INTERVAL = int(os.getenv("ADS_CHANGES_PURGE_INTERVAL", 3600))
+# Импорт /ads/import: строк в одном COPY, подробностей ошибок в ответе, максимальная длина записи (байт)
+ADS_IMPORT_BATCH_SIZE = int(os.getenv("ADS_IMPORT_BATCH_SIZE", 5000))
+ADS_IMPORT_MAX_ERRORS = int(os.getenv("ADS_IMPORT_MAX_ERRORS", 100))
+ADS_IMPORT_MAX_RECORD = int(os.getenv("ADS_IMPORT_MAX_RECORD", 1024 * 1024))
+# Выгрузка /ads/export: размер отдаваемого куска (байт), очередь между COPY и клиентом (кусков), уровень gzip
+ADS_EXPORT_CHUNK_SIZE = int(os.getenv("ADS_EXPORT_CHUNK_SIZE", 64 * 1024))
+ADS_EXPORT_QUEUE_CHUNKS = int(os.getenv("ADS_EXPORT_QUEUE_CHUNKS", 16))
+ADS_EXPORT_GZIP_LEVEL = int(os.getenv("ADS_EXPORT_GZIP_LEVEL", 6))
+
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread").lower()  # thread | process
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 2))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", 64))
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+TOKEN_REVOCATION_SYNC_INTERVAL = float(os.getenv("TOKEN_REVOCATION_SYNC_INTERVAL", 5))
+# Отзывы перечитываются с запасом (с): revoked_at ставится до COMMIT, запись может стать видна позже
+TOKEN_REVOCATION_SYNC_OVERLAP = float(os.getenv("TOKEN_REVOCATION_SYNC_OVERLAP", 60))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PERMISSION_CACHE_SIZE = int(os.getenv("PERMISSION_CACHE_SIZE", 10000))
+PERMISSION_CACHE_TTL = int(os.getenv("PERMISSION_CACHE_TTL", 300))
+AD_CACHE_SIZE = int(os.getenv("AD_CACHE_SIZE", 10000))
+AD_CACHE_TTL = int(os.getenv("AD_CACHE_TTL", 30))
+# Число объявлений автора для /users/me/ads; на других воркерах обновляется по TTL
+AUTHOR_COUNT_CACHE_SIZE = int(os.getenv("AUTHOR_COUNT_CACHE_SIZE", 10000))
+AUTHOR_COUNT_CACHE_TTL = int(os.getenv("AUTHOR_COUNT_CACHE_TTL", 60))
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "False").lower() in ("true", "1")
+# Кеши подготовленных выражений asyncpg; 0 — для pgbouncer в режиме transaction
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", 100))
+
+# Счётчик просмотров: период сброса в БД (0 — только при остановке) и максимум объявлений в буфере воркера
+VIEW_FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", 5))
+VIEW_BUFFER_SIZE = int(os.getenv("VIEW_BUFFER_SIZE", 10000))
+
+# Сжатие ответов: минимальный размер тела (байт), уровни gzip/brotli/zstd, тела от COMPRESSION_OFFLOAD_SIZE
+# сжимаются в потоке; кеш сжатых страниц списков — записей, TTL (с), максимальный размер тела; потоковый ответ
+# сбрасывается клиенту не чаще, чем через COMPRESSION_STREAM_FLUSH_SIZE байт исходного тела
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "True").lower() in ("true", "1")
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_LEVEL = int(os.getenv("COMPRESSION_BROTLI_LEVEL", 4))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", 3))
+COMPRESSION_OFFLOAD_SIZE = int(os.getenv("COMPRESSION_OFFLOAD_SIZE", 256 * 1024))
+COMPRESSION_CACHE_SIZE = int(os.getenv("COMPRESSION_CACHE_SIZE", 128))
+COMPRESSION_CACHE_TTL = float(os.getenv("COMPRESSION_CACHE_TTL", 60))
+COMPRESSION_CACHE_MAX_BODY = int(os.getenv("COMPRESSION_CACHE_MAX_BODY", 512 * 1024))
+COMPRESSION_STREAM_FLUSH_SIZE = int(os.getenv("COMPRESSION_STREAM_FLUSH_SIZE", 32 * 1024))
+
+# Ограничение частоты запросов: "N/S" — N запросов за S секунд (с burst до N), пусто — без ограничения
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True").lower() in ("true", "1")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()  # memory | postgres
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+RATE_LIMIT_PURGE_INTERVAL = int(os.getenv("RATE_LIMIT_PURGE_INTERVAL", 600))  # очистка bucket'ов postgres-хранилища
+RATE_LIMIT_IDLE_TTL = int(os.getenv("RATE_LIMIT_IDLE_TTL", 3600))  # должно быть больше периода любого лимита
+RATE_LIMIT_LOGIN = os.getenv("RATE_LIMIT_LOGIN", "10/60")  # вход и регистрация, по IP
+RATE_LIMIT_READ = os.getenv("RATE_LIMIT_READ", "120/60")  # список и поиск объявлений, по IP
+RATE_LIMIT_WRITE = os.getenv("RATE_LIMIT_WRITE", "60/60")  # изменение объявлений, по пользователю
+RATE_LIMIT_EXPORT = os.getenv("RATE_LIMIT_EXPORT", "5/60")  # выгрузка каталога, по IP
+
+# Живая лента /ads/stream: подписчиков на воркер, очередь подписчика (событий), keepalive SSE
+LIVE_FEED_ENABLED = os.getenv("LIVE_FEED_ENABLED", "True").lower() in ("true", "1")
+LIVE_FEED_MAX_SUBSCRIBERS = int(os.getenv("LIVE_FEED_MAX_SUBSCRIBERS", 1000))
+LIVE_FEED_BUFFER = int(os.getenv("LIVE_FEED_BUFFER", 100))
+LIVE_FEED_KEEPALIVE = float(os.getenv("LIVE_FEED_KEEPALIVE", 15))
+LIVE_FEED_RECONNECT_INTERVAL = float(os.getenv("LIVE_FEED_RECONNECT_INTERVAL", 2))
+# Оператор, изменивший больше объявлений, приходит подписчикам одним событием bulk со списком id
+LIVE_FEED_BULK_THRESHOLD = int(os.getenv("LIVE_FEED_BULK_THRESHOLD", 20))
+
+# Запуск: main.py
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", 8000))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", os.cpu_count() or 1))
+# Сколько старт воркера ждёт прогрева, прежде чем продолжить его в фоне
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", 30))
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", 2))
+
+# Реплики для чтения: DSN через запятую (postgresql+asyncpg://...)
+DB_REPLICA_DSNS = [dsn.strip() for dsn in os.getenv("DB_REPLICA_DSNS", "").split(",") if dsn.strip()]
+DB_REPLICA_HEALTH_INTERVAL = int(os.getenv("DB_REPLICA_HEALTH_INTERVAL", 5))
+DB_REPLICA_HEALTH_TIMEOUT = float(os.getenv("DB_REPLICA_HEALTH_TIMEOUT", 1))
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", 10))
+# Сколько секунд после записи клиент читает с primary
+READ_YOUR_WRITES_WINDOW = int(os.getenv("READ_YOUR_WRITES_WINDOW", 5))
\ No newline at end of file
@@ -0,0 +1,82 @@
+import logging
+import time
+from collections import Counter
+from sqlalchemy import BigInteger, Integer, column, update, values
+from config import VIEW_BUFFER_SIZE
+from db import async_session
+from models import Advertisement
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """
+    Счётчик просмотров объявлений с отложенной записью.
+    Просмотры копятся в памяти воркера и сбрасываются в БД одним
+    UPDATE ... FROM (VALUES ...), так что чтение не берёт блокировок строк.
+    Буфер ограничен по числу объявлений: при переполнении просмотры новых
+    объявлений отбрасываются до следующего сброса (учитываются в dropped).
+    Счётчик в ответах отстаёт на период сброса и TTL кеша объявлений:
+    version не меняется, чтобы просмотры не сбрасывали кеш; ETag учитывает views.
+    """
+
+    def __init__(self, maxsize: int = VIEW_BUFFER_SIZE):
+        self.maxsize = maxsize
+        self.pending: Counter[int] = Counter()
+        self.flushed = 0
+        self.dropped = 0
+        self.failures = 0
+        self.last_flush_time = 0.0
+
+    def hit(self, ad_id: int) -> None:
+        if ad_id not in self.pending and len(self.pending) >= self.maxsize:
+            self.dropped += 1
+            return
+        self.pending[ad_id] += 1
+
+    async def flush(self) -> int:
+        """Сбрасывает накопленные просмотры в БД; возвращает число обновлённых объявлений."""
+        if not self.pending:
+            return 0
+        batch, self.pending = self.pending, Counter()
+        # Одинаковый порядок строк у всех воркеров — без взаимных блокировок
+        rows = sorted(batch.items())
+        data = values(column("id", Integer), column("views", BigInteger), name="data").data(rows)
+        stmt = (
+            update(Advertisement)
+            .where(Advertisement.id == data.c.id)
+            .values(views=Advertisement.views + data.c.views)
+            .execution_options(synchronize_session=False)
+        )
+        started = time.perf_counter()
+        try:
+            async with async_session() as session:
+                await session.execute(stmt)
+                await session.commit()
+        except Exception:
+            # Возвращаем пачку в буфер (в его пределах) и пробуем при следующем сбросе
+            self.failures += 1
+            for ad_id, views in batch.items():
+                if ad_id in self.pending or len(self.pending) < self.maxsize:
+                    self.pending[ad_id] += views
+                else:
+                    self.dropped += views
+            raise
+        self.last_flush_time = time.perf_counter() - started
+        self.flushed += sum(batch.values())
+        logger.debug("Flushed views for %d ads in %.1f ms", len(rows), self.last_flush_time * 1000)
+        return len(rows)
+
+    def stats(self) -> dict:
+        return {
+            "pending_ads": len(self.pending),
+            "pending_views": sum(self.pending.values()),
+            "maxsize": self.maxsize,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failures": self.failures,
+            "last_flush_time": self.last_flush_time,
+        }
+
+
+view_counter = ViewCounter()
@@ -23,6 +23,31 @@ class AdvertisementResponse(AdvertisementBase):
     id: int
     created_at: datetime
     author_id: int
+    views: int = 0
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
+
+
+class AdvertisementBulkUpdate(AdvertisementUpdate):
+    id: int
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    status: str
+    ad: Optional[AdvertisementResponse] = None
+
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+
+class ImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: list[ImportRowError]
+    errors_truncated: bool = False
@@ -1,12 +1,17 @@
 import datetime
 import uuid
-from typing import Annotated, AsyncGenerator
-from config import async_session, TOKEN_TTL
-from fastapi import Depends, Header, HTTPException
+from dataclasses import dataclass
+from typing import Annotated, AsyncGenerator, Optional
+from cache import TTLCache
+from db import async_session
+from config import TOKEN_TTL, ACCESS_TOKEN_EXPIRE_MINUTES, PRINCIPAL_CACHE_SIZE
+from fastapi import Depends, Header, HTTPException, Request
 from models import Token, User
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-from auth import verify_access_token
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from auth import decode_access_token
+from replicas import read_sessionmaker
+from statements import TOKEN_BY_VALUE
 from fastapi.security import OAuth2PasswordBearer
 
 # Создаем схему для OAuth2
@@ -22,15 +27,29 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 SessionDependency = Annotated[AsyncSession, Depends(get_db, use_cache=True)]
 
 
+async def get_read_sessionmaker(request: Request) -> async_sessionmaker[AsyncSession]:
+    """Фабрика сессий только для чтения (реплика или primary)."""
+    return read_sessionmaker(request)
+
+
+ReadSessionmakerDependency = Annotated[async_sessionmaker[AsyncSession], Depends(get_read_sessionmaker)]
+
+
+async def get_read_db(session_factory: ReadSessionmakerDependency) -> AsyncGenerator[AsyncSession, None]:
+    """Получение сессии только для чтения."""
+    async with session_factory() as session:
+        yield session
+
+
+ReadSessionDependency = Annotated[AsyncSession, Depends(get_read_db)]
+
+
 async def get_token(
     session: SessionDependency, x_token: Annotated[uuid.UUID | None, Header()] = None
 ) -> Token:
     """Получение токена из заголовка запроса."""
-    token_query = select(Token).where(
-        Token.token == x_token,
-        Token.creation_time >= datetime.datetime.utcnow() - datetime.timedelta(seconds=TOKEN_TTL),
-    )
-    token = (await session.scalars(token_query)).first()
+    since = datetime.datetime.utcnow() - datetime.timedelta(seconds=TOKEN_TTL)
+    token = (await session.scalars(TOKEN_BY_VALUE, {"token": x_token, "since": since})).first()
     if token:
         return token
     raise HTTPException(status_code=401, detail="Invalid token")
@@ -39,15 +58,37 @@ async def get_token(
 TokenDependency = Annotated[Token, Depends(get_token)]
 
 
+@dataclass(frozen=True)
+class Principal:
+    """Аутентифицированный пользователь без загрузки связанных объектов."""
+    id: int
+    name: str
+
+
+# user_id -> Principal; сам токен проверяется (и кешируется) в auth.decode_access_token
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+async def load_principal(db: AsyncSession, user_id: int) -> Optional[Principal]:
+    """Загрузка id и имени пользователя одним узким запросом."""
+    row = (await db.execute(select(User.id, User.name).where(User.id == user_id))).one_or_none()
+    if row is None:
+        return None
+    return Principal(id=row.id, name=row.name)
+
+
 async def get_current_user(
     db: SessionDependency, token: str = Depends(oauth2_scheme)
-) -> User:
+) -> Principal:
     """Получение текущего пользователя по токену."""
-    user_id = await verify_access_token(token)
-    user = await db.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-    return user
+    user_id = int((await decode_access_token(token))["sub"])
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        principal = await load_principal(db, user_id)
+        if not principal:
+            raise HTTPException(status_code=401, detail="User not found")
+        principal_cache.set(user_id, principal)
+    return principal
 
 
-UserDependency = Annotated[User, Depends(get_current_user)]
+UserDependency = Annotated[Principal, Depends(get_current_user)]
@@ -0,0 +1,145 @@
+"""
+Потоковая выгрузка объявлений в CSV или NDJSON (по желанию в gzip).
+
+Данные отдаёт сам PostgreSQL через COPY (SELECT ...) TO STDOUT, без ORM и
+без сборки списка в памяти. Между COPY и ответом — очередь из
+ADS_EXPORT_QUEUE_CHUNKS кусков: если клиент читает медленно, очередь
+заполняется, asyncpg перестаёт читать сокет базы и COPY ждёт. Память на
+выгрузку ограничена очередью, каким бы большим ни был каталог.
+"""
+import asyncio
+import datetime
+import logging
+import zlib
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from config import ADS_EXPORT_CHUNK_SIZE, ADS_EXPORT_GZIP_LEVEL, ADS_EXPORT_QUEUE_CHUNKS
+from models import Advertisement
+from statements import AD_COLUMNS, MARK_BULK_READ
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+@dataclass
+class ExportFilter:
+    author_id: Optional[int] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    created_from: Optional[datetime.datetime] = None
+    created_to: Optional[datetime.datetime] = None
+
+    def __post_init__(self):
+        # created_at — timestamp without time zone (UTC): aware-значение asyncpg отверг бы уже внутри COPY,
+        # после отправленного 200, и клиент получил бы оборванный файл
+        self.created_from = _naive_utc(self.created_from)
+        self.created_to = _naive_utc(self.created_to)
+
+
+def _naive_utc(value: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def export_query(fmt: str, filters: ExportFilter):
+    """SELECT для COPY; порядок строк не задан — сортировка всего каталога мешала бы отдавать его сразу."""
+    query = select(*AD_COLUMNS)
+    if filters.author_id is not None:
+        query = query.where(Advertisement.author_id == filters.author_id)
+    if filters.min_price is not None:
+        query = query.where(Advertisement.price >= filters.min_price)
+    if filters.max_price is not None:
+        query = query.where(Advertisement.price <= filters.max_price)
+    if filters.created_from is not None:
+        query = query.where(Advertisement.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        query = query.where(Advertisement.created_at < filters.created_to)
+    if fmt == "ndjson":
+        rows = query.subquery("ad")
+        query = select(func.row_to_json(rows.table_valued()))
+    return query
+
+
+def copy_options(fmt: str) -> dict:
+    if fmt == "csv":
+        return {"format": "csv", "header": True}
+    # Одна колонка JSON: в формате text COPY экранировал бы обратные слеши, поэтому csv
+    # с кавычкой и разделителем, которых в выводе row_to_json не бывает (управляющие символы он экранирует)
+    return {"format": "csv", "quote": "\x01", "delimiter": "\x02"}
+
+
+class ExportAborted(Exception):
+    pass
+
+
+async def _copy_out(session_factory: async_sessionmaker[AsyncSession], fmt: str, filters: ExportFilter,
+                    sink: Callable[[bytes], Awaitable]) -> None:
+    async with session_factory() as session:
+        # COPY идёт столько, сколько клиент читает выгрузку, — ленту изменений он не задерживает
+        await session.execute(MARK_BULK_READ)
+        conn = await session.connection()
+        compiled = export_query(fmt, filters).compile(dialect=conn.dialect)
+        args = [compiled.params[name] for name in compiled.positiontup]
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_from_query(compiled.string, *args, output=sink, **copy_options(fmt))
+
+
+async def stream_export(
+    session_factory: async_sessionmaker[AsyncSession],
+    fmt: str,
+    filters: ExportFilter,
+    gzip: bool = False,
+) -> AsyncIterator[bytes]:
+    """Куски выгрузки по ~ADS_EXPORT_CHUNK_SIZE байт; при gzip — сжатые."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=ADS_EXPORT_QUEUE_CHUNKS)
+    aborted = False
+
+    async def sink(data: bytes) -> None:
+        # Прервать COPY можно только из sink: отмена задачи, пока asyncpg ждёт данных
+        # от сервера, ломает состояние соединения
+        if aborted:
+            raise ExportAborted
+        await queue.put(data)
+
+    copy_task = asyncio.create_task(_copy_out(session_factory, fmt, filters, sink))
+    # Конец выгрузки (успешный или с ошибкой) — будим читателя пустым куском
+    copy_task.add_done_callback(lambda _: queue.put_nowait(None) if not queue.full() else None)
+    compressor = zlib.compressobj(ADS_EXPORT_GZIP_LEVEL, wbits=31) if gzip else None
+    buffer = bytearray()
+    try:
+        while not (copy_task.done() and queue.empty()):
+            chunk = await queue.get()
+            if chunk is None:
+                continue
+            buffer += chunk
+            if len(buffer) < ADS_EXPORT_CHUNK_SIZE:
+                continue
+            data = compressor.compress(bytes(buffer)) if compressor else bytes(buffer)
+            buffer.clear()
+            if data:
+                yield data
+        # Ошибка COPY на середине — обрываем ответ, а не отдаём неполный файл как целый
+        copy_task.result()
+        data = bytes(buffer)
+        if compressor:
+            data = compressor.compress(data) + compressor.flush()
+        if data:
+            yield data
+    finally:
+        if not copy_task.done():
+            # Клиент отключился: освобождаем очередь, на следующем куске sink прервёт COPY.
+            # Ждать здесь нельзя — задача ответа уже отменена
+            aborted = True
+            while not queue.empty():
+                queue.get_nowait()
+            copy_task.add_done_callback(_log_copy_error)
+
+
+def _log_copy_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and not isinstance(task.exception(), (ExportAborted, type(None))):
+        logger.error("Export COPY failed after the client disconnected", exc_info=task.exception())
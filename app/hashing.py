@@ -0,0 +1,111 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+from bcrypt import checkpw, gensalt, hashpw
+from fastapi import HTTPException
+from config import HASH_EXECUTOR, HASH_QUEUE_SIZE, HASH_WORKERS
+
+_executor: Optional[Executor] = None
+_pending = 0
+_stats = {
+    "completed": 0,
+    "rejected": 0,
+    "hash_time_total": 0.0,
+    "hash_time_max": 0.0,
+    "wait_time_total": 0.0,
+}
+
+
+def _hash(password: str) -> tuple[str, float]:
+    started = time.perf_counter()
+    hashed = hashpw(password.encode(), gensalt()).decode()
+    return hashed, time.perf_counter() - started
+
+
+def _verify(password: str, hashed_password: str) -> tuple[bool, float]:
+    started = time.perf_counter()
+    try:
+        ok = checkpw(password.encode(), hashed_password.encode())
+    except ValueError:
+        ok = False
+    return ok, time.perf_counter() - started
+
+
+def get_executor() -> Executor:
+    """Пул для bcrypt: потоки (bcrypt отпускает GIL) или процессы."""
+    global _executor
+    if _executor is None:
+        if HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def warm_up() -> None:
+    """
+    Запускает все воркеры пула и загружает bcrypt в каждом из них заранее,
+    чтобы первые входы после старта не ждали создания потоков/процессов.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    # Дешёвый хеш (cost 4) — проверка не нагружает CPU при старте
+    hashed = hashpw(b"warmup", gensalt(4)).decode()
+    await asyncio.gather(*(loop.run_in_executor(executor, _verify, "warmup", hashed) for _ in range(HASH_WORKERS)))
+
+
+async def _run(func, *args):
+    """
+    Выполняет bcrypt в пуле. Если очередь заполнена, сразу отвечает 503,
+    не дожидаясь освобождения воркеров.
+    """
+    global _pending
+    if _pending >= HASH_WORKERS + HASH_QUEUE_SIZE:
+        _stats["rejected"] += 1
+        raise HTTPException(status_code=503, detail="Server is busy, try again later", headers={"Retry-After": "1"})
+
+    _pending += 1
+    submitted = time.perf_counter()
+    try:
+        result, elapsed = await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+    finally:
+        _pending -= 1
+
+    _stats["completed"] += 1
+    _stats["hash_time_total"] += elapsed
+    _stats["hash_time_max"] = max(_stats["hash_time_max"], elapsed)
+    _stats["wait_time_total"] += time.perf_counter() - submitted - elapsed
+    return result
+
+
+async def hash_password(password: str) -> str:
+    return await _run(_hash, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await _run(_verify, password, hashed_password)
+
+
+def get_stats() -> dict:
+    """Метрики пула хеширования."""
+    completed = _stats["completed"]
+    return {
+        "executor": HASH_EXECUTOR,
+        "workers": HASH_WORKERS,
+        "queue_size": HASH_QUEUE_SIZE,
+        "in_flight": min(_pending, HASH_WORKERS),
+        "queue_depth": max(0, _pending - HASH_WORKERS),
+        "completed": completed,
+        "rejected": _stats["rejected"],
+        "hash_time_avg": _stats["hash_time_total"] / completed if completed else 0.0,
+        "hash_time_max": _stats["hash_time_max"],
+        "wait_time_avg": _stats["wait_time_total"] / completed if completed else 0.0,
+    }
@@ -0,0 +1,58 @@
+"""
+Импорт объявлений из файла CSV или NDJSON напрямую в базу (COPY, см. importer.py).
+
+    python import_ads.py ads.csv --author-id 1
+    python import_ads.py ads.ndjson --author-id 1 --batch-size 10000
+    cat ads.ndjson | python import_ads.py - --author-id 1 --format ndjson
+"""
+import argparse
+import asyncio
+import os
+import sys
+from typing import AsyncIterator, BinaryIO
+from config import ADS_IMPORT_BATCH_SIZE
+from db import engine
+import importer
+
+CHUNK_SIZE = 256 * 1024
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bulk import of advertisements via COPY")
+    parser.add_argument("path", help="CSV/NDJSON file, - for stdin")
+    parser.add_argument("--author-id", type=int, required=True)
+    parser.add_argument("--format", choices=importer.FORMATS, help="by default — from the file extension")
+    parser.add_argument("--batch-size", type=int, default=ADS_IMPORT_BATCH_SIZE)
+    return parser.parse_args()
+
+
+async def read_chunks(file: BinaryIO) -> AsyncIterator[bytes]:
+    while chunk := await asyncio.to_thread(file.read, CHUNK_SIZE):
+        yield chunk
+
+
+async def main() -> int:
+    args = parse_args()
+    fmt = args.format
+    if fmt is None:
+        extension = os.path.splitext(args.path)[1].lower()
+        fmt = "csv" if extension == ".csv" else "ndjson" if extension in (".ndjson", ".jsonl") else None
+        if fmt is None:
+            print("Cannot detect the format, pass --format", file=sys.stderr)
+            return 2
+    file = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    try:
+        result = await importer.import_ads(read_chunks(file), fmt, args.author_id, batch_size=args.batch_size)
+    finally:
+        file.close()
+        await engine.dispose()
+    for error in result.errors:
+        print(f"row {error.row}: {error.error}", file=sys.stderr)
+    if result.errors_truncated:
+        print("... more errors omitted", file=sys.stderr)
+    print(f"Imported {result.imported}, failed {result.failed}")
+    return 1 if result.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
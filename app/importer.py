@@ -0,0 +1,211 @@
+"""
+Потоковый импорт объявлений из CSV или NDJSON.
+
+Вход читается кусками, записи проверяются по одной (crud.AdvertisementCreate)
+и пачками по ADS_IMPORT_BATCH_SIZE строк загружаются через COPY
+(asyncpg copy_records_to_table) — память не зависит от размера файла.
+Каждая пачка — отдельный COPY: уже загруженные пачки остаются в базе,
+если импорт прервётся.
+"""
+import codecs
+import csv
+import logging
+from typing import AsyncIterator, Optional, Union
+import asyncpg
+import orjson
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from config import ADS_IMPORT_BATCH_SIZE, ADS_IMPORT_MAX_ERRORS, ADS_IMPORT_MAX_RECORD
+from crud import AdvertisementCreate, ImportResult, ImportRowError
+from db import engine
+from models import Advertisement
+from schemas import author_count_cache
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+COPY_COLUMNS = ("title", "description", "price", "author_id")
+TITLE_MAX_LENGTH = Advertisement.__table__.c.title.type.length
+
+
+class RecordError(ValueError):
+    pass
+
+
+# (номер строки входа, запись или ошибка разбора этой записи)
+ParsedRecord = tuple[int, Union[dict, RecordError]]
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Строки UTF-8 из потока байтов (без перевода строки)."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    async for chunk in chunks:
+        text = tail + decoder.decode(chunk)
+        lines = text.split("\n")
+        tail = lines.pop()
+        if len(tail) > ADS_IMPORT_MAX_RECORD:
+            raise RecordError(f"Line is longer than {ADS_IMPORT_MAX_RECORD} bytes")
+        for line in lines:
+            yield line.removesuffix("\r")
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail.removesuffix("\r")
+
+
+async def iter_csv(lines: AsyncIterator[str]) -> AsyncIterator[ParsedRecord]:
+    """
+    (номер строки, запись) из CSV с заголовком; нужны колонки title и price.
+    Запись в кавычках может занимать несколько строк: она закончена, когда кавычек чётное число.
+    """
+    header: Optional[list[str]] = None
+    parts: list[str] = []
+    quotes = size = start = 0
+    row = 0
+    async for line in lines:
+        row += 1
+        if not parts:
+            start = row
+        parts.append(line)
+        quotes += line.count('"')
+        size += len(line)
+        if quotes % 2:
+            if size > ADS_IMPORT_MAX_RECORD:
+                raise RecordError(f"Row {start}: record is longer than {ADS_IMPORT_MAX_RECORD} bytes")
+            continue
+        values = next(csv.reader(["\n".join(parts)]), [])
+        parts, quotes, size = [], 0, 0
+        if not any(values):
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            missing = {"title", "price"} - set(header)
+            if missing:
+                raise RecordError(f"CSV header has no columns: {', '.join(sorted(missing))}")
+            continue
+        if len(values) != len(header):
+            yield start, RecordError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        # Пустая ячейка description — отсутствие описания
+        yield start, {name: value for name, value in zip(header, values) if value != "" or name != "description"}
+    if parts:
+        yield start, RecordError("Unterminated quoted field")
+
+
+async def iter_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[ParsedRecord]:
+    """(номер строки, запись) из NDJSON: по JSON-объекту на строку, пустые строки пропускаются."""
+    row = 0
+    async for line in lines:
+        row += 1
+        if not line.strip():
+            continue
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield row, RecordError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            yield row, RecordError("Expected a JSON object")
+            continue
+        yield row, record
+
+
+def validate_record(record: dict, author_id: int) -> tuple:
+    """Запись -> строка для COPY (в порядке COPY_COLUMNS)."""
+    ad = AdvertisementCreate.model_validate(record)
+    if len(ad.title) > TITLE_MAX_LENGTH:
+        raise RecordError(f"title is longer than {TITLE_MAX_LENGTH} characters")
+    return ad.title, ad.description, ad.price, author_id
+
+
+def _error_text(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(map(str, item['loc'])) or 'record'}: {item['msg']}" for item in error.errors()
+        )
+    return str(error)
+
+
+class ImportReport:
+    """Итоги импорта; подробности хранятся только для первых max_errors ошибок."""
+
+    def __init__(self, max_errors: int = ADS_IMPORT_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.imported = 0
+        self.failed = 0
+        self.errors: list[ImportRowError] = []
+        self.errors_dropped = 0
+
+    def fail(self, row: int, error: Exception, rows: int = 1) -> None:
+        self.failed += rows
+        if len(self.errors) < self.max_errors:
+            self.errors.append(ImportRowError(row=row, error=_error_text(error)))
+        else:
+            self.errors_dropped += 1
+
+    def result(self) -> ImportResult:
+        return ImportResult(
+            imported=self.imported,
+            failed=self.failed,
+            errors=self.errors,
+            errors_truncated=self.errors_dropped > 0,
+        )
+
+
+async def copy_batch(db_engine: AsyncEngine, batch: list[tuple]) -> None:
+    """Один COPY ... FROM STDIN в advertisement; COPY атомарен, отдельная транзакция не нужна."""
+    async with db_engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            Advertisement.__tablename__, records=batch, columns=COPY_COLUMNS,
+        )
+
+
+async def import_ads(
+    chunks: AsyncIterator[bytes],
+    fmt: str,
+    author_id: int,
+    batch_size: int = ADS_IMPORT_BATCH_SIZE,
+    db_engine: AsyncEngine = engine,
+) -> ImportResult:
+    """Импорт объявлений автора author_id из потока байтов в формате fmt (csv | ndjson)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format {fmt!r}")
+    parse = iter_csv if fmt == "csv" else iter_ndjson
+    report = ImportReport()
+    batch: list[tuple] = []
+    first_row = 0
+
+    async def flush() -> None:
+        try:
+            await copy_batch(db_engine, batch)
+        except (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError) as e:
+            # Строки прошли проверку, но их отверг PostgreSQL — пачка не загружена целиком
+            report.fail(first_row, e, rows=len(batch))
+        else:
+            report.imported += len(batch)
+        batch.clear()
+
+    try:
+        async for row, record in parse(iter_lines(chunks)):
+            if isinstance(record, Exception):
+                report.fail(row, record)
+                continue
+            try:
+                values = validate_record(record, author_id)
+            except (ValidationError, RecordError) as e:
+                report.fail(row, e)
+                continue
+            if not batch:
+                first_row = row
+            batch.append(values)
+            if len(batch) >= batch_size:
+                await flush()
+    except RecordError as e:
+        # Дальше разбирать поток нельзя: загружаем то, что уже проверено, и сообщаем об ошибке (row=0)
+        report.fail(0, e, rows=0)
+    if batch:
+        await flush()
+    author_count_cache.pop(author_id)
+    logger.info("Imported %d ads for user %s, %d rows failed", report.imported, author_id, report.failed)
+    return report.result()
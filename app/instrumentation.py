@@ -0,0 +1,105 @@
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import SQL_QUERY_BUDGET, SQL_REPEAT_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """SQL-статистика одного HTTP-запроса."""
+
+    __slots__ = ("count", "db_time", "rows", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.shapes: Counter[str] = Counter()
+
+    def repeated(self) -> list[tuple[str, int]]:
+        """Выражения, выполненные не менее SQL_REPEAT_THRESHOLD раз (признак N+1)."""
+        return [(sql, n) for sql, n in self.shapes.most_common() if n >= SQL_REPEAT_THRESHOLD]
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("sql_query_stats", default=None)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None or not conn.info.get("query_started"):
+        return
+    stats.count += 1
+    stats.db_time += time.perf_counter() - conn.info["query_started"].pop()
+    stats.rows += max(cursor.rowcount, 0)
+    # Параметры передаются отдельно, поэтому текст выражения и есть его «форма»
+    stats.shapes[statement] += 1
+
+
+def instrument(engine: AsyncEngine) -> None:
+    """Подключает подсчёт запросов к движку."""
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Считает SQL-запросы каждого HTTP-запроса, отдаёт их в заголовке Server-Timing
+    и пишет предупреждение при превышении бюджета или повторах одного выражения.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                total = (time.perf_counter() - started) * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.db_time * 1000:.2f};desc="{stats.count} queries, {stats.rows} rows", '
+                    f"total;dur={total:.2f}",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._check(scope, stats)
+
+    @staticmethod
+    def _check(scope: Scope, stats: QueryStats) -> None:
+        repeated = stats.repeated()
+        if stats.count <= SQL_QUERY_BUDGET and not repeated:
+            return
+        route = f"{scope['method']} {scope['path']}"
+        if stats.count > SQL_QUERY_BUDGET:
+            logger.warning("%s ran %d queries (budget %d, %.1f ms)", route, stats.count, SQL_QUERY_BUDGET,
+                           stats.db_time * 1000)
+        for statement, times in repeated:
+            logger.warning("%s: possible N+1, statement ran %d times: %.200s", route, times, statement)
@@ -0,0 +1,220 @@
+"""
+Живая лента объявлений: события из триггеров advertisement (NOTIFY) раздаются
+подписчикам /ads/stream (SSE и WebSocket).
+
+На воркер — одно выделенное LISTEN-соединение; у каждого подписчика свои фильтры
+и ограниченная очередь. Медленный подписчик, очередь которого переполнилась,
+отключается, а не копит события в памяти.
+
+Триггер шлёт одно уведомление на оператор: {"op", "ads": [...]} или, если объявления
+не поместились в NOTIFY, {"op", "ids": [...]}. Оператор, затронувший больше
+LIVE_FEED_BULK_THRESHOLD объявлений (массовые запросы, импорт), раздаётся одним
+событием bulk, а не сотнями событий, которые переполнили бы очереди подписчиков.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+import asyncpg
+import orjson
+from fastapi import WebSocket, WebSocketDisconnect
+from sqlalchemy import select
+from config import (
+    LIVE_FEED_BUFFER, LIVE_FEED_BULK_THRESHOLD, LIVE_FEED_KEEPALIVE, LIVE_FEED_MAX_SUBSCRIBERS,
+    LIVE_FEED_RECONNECT_INTERVAL, POSTGRES_DB, POSTGRES_HOST, POSTGRES_PASSWORD, POSTGRES_PORT, POSTGRES_USER,
+)
+from db import async_session
+from models import AD_CHANGES_CHANNEL, Advertisement
+from schemas import AD_COLUMNS, AD_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AdEvent:
+    """Событие ленты; data — готовый JSON, один на всех подписчиков."""
+    op: str
+    data: bytes
+    title: Optional[str] = None
+    price: Optional[float] = None
+
+    def sse(self) -> bytes:
+        return b"event: " + self.op.encode() + b"\ndata: " + self.data + b"\n\n"
+
+
+@dataclass(eq=False)
+class Subscriber:
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    q: Optional[str] = None
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=LIVE_FEED_BUFFER))
+    overflowed: bool = False
+
+    def matches(self, event: AdEvent) -> bool:
+        # Удаления и bulk получают все: у события нет полей объявления
+        if event.title is None:
+            return True
+        if self.min_price is not None and event.price < self.min_price:
+            return False
+        if self.max_price is not None and event.price > self.max_price:
+            return False
+        return not self.q or self.q in event.title.lower()
+
+
+class AdFeed:
+    def __init__(self):
+        self.subscribers: set[Subscriber] = set()
+        self.connected = False
+        self.events = 0
+        self.bulk_events = 0
+        self.dropped_subscribers = 0
+        self._pending: set[asyncio.Task] = set()
+
+    def subscribe(self, min_price: Optional[float] = None, max_price: Optional[float] = None,
+                  q: Optional[str] = None) -> Optional[Subscriber]:
+        """Новый подписчик или None, если лимит подписчиков воркера исчерпан."""
+        if len(self.subscribers) >= LIVE_FEED_MAX_SUBSCRIBERS:
+            return None
+        subscriber = Subscriber(min_price=min_price, max_price=max_price, q=q.lower() if q else None)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    def publish(self, event: AdEvent) -> None:
+        self.events += 1
+        for subscriber in list(self.subscribers):
+            if not subscriber.matches(event):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber: Subscriber) -> None:
+        """Отключение отстающего подписчика: вместо накопленных событий — None (конец потока)."""
+        self.dropped_subscribers += 1
+        subscriber.overflowed = True
+        self.subscribers.discard(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        message = orjson.loads(payload)
+        op = message["op"]
+        ads = message.get("ads")
+        ids = [ad["id"] for ad in ads] if ads is not None else message["ids"]
+        if len(ids) > LIVE_FEED_BULK_THRESHOLD:
+            self.bulk_events += 1
+            self.publish(AdEvent(op="bulk", data=orjson.dumps({"op": op, "ids": ids})))
+        elif ads is not None:
+            for ad in ads:
+                self._publish_ad(op, ad)
+        elif op == "delete":
+            for ad_id in ids:
+                self.publish(AdEvent(op="delete", data=orjson.dumps({"op": "delete", "id": ad_id})))
+        else:
+            # Объявления не поместились в NOTIFY — дочитываем их из БД
+            task = asyncio.create_task(self._publish_loaded(op, ids))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    def _publish_ad(self, op: str, ad: dict) -> None:
+        data = orjson.dumps({"op": op, "id": ad["id"], "ad": ad})
+        self.publish(AdEvent(op=op, data=data, title=ad["title"], price=ad["price"]))
+
+    async def _publish_loaded(self, op: str, ids: list[int]) -> None:
+        try:
+            async with async_session() as session:
+                query = select(*AD_COLUMNS).where(Advertisement.id.in_(ids)).order_by(Advertisement.id)
+                rows = (await session.execute(query)).all()
+        except Exception:
+            logger.exception("Failed to load advertisements %s for the live feed", ids)
+            return
+        for row in rows:
+            self._publish_ad(op, dict(zip(AD_FIELDS, row)))
+
+    async def run(self) -> None:
+        """Держит LISTEN-соединение, переподключаясь после обрывов, до отмены задачи."""
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(
+                    host=POSTGRES_HOST, port=POSTGRES_PORT, user=POSTGRES_USER,
+                    password=POSTGRES_PASSWORD, database=POSTGRES_DB,
+                )
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(AD_CHANGES_CHANNEL, self._on_notify)
+                self.connected = True
+                await closed.wait()
+                logger.warning("Live feed connection lost, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Live feed listener failed, retrying in %s s", LIVE_FEED_RECONNECT_INTERVAL)
+            finally:
+                self.connected = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(LIVE_FEED_RECONNECT_INTERVAL)
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "subscribers": len(self.subscribers),
+            "max_subscribers": LIVE_FEED_MAX_SUBSCRIBERS,
+            "buffer": LIVE_FEED_BUFFER,
+            "events": self.events,
+            "bulk_events": self.bulk_events,
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+ad_feed = AdFeed()
+
+
+async def sse_stream(subscriber: Subscriber) -> AsyncIterator[bytes]:
+    """События подписчика в формате text/event-stream; при переполнении — event: overflow и конец потока."""
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), LIVE_FEED_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if event is None:
+                yield b"event: overflow\ndata: {}\n\n"
+                return
+            yield event.sse()
+    finally:
+        ad_feed.unsubscribe(subscriber)
+
+
+async def websocket_stream(websocket: WebSocket, subscriber: Subscriber) -> None:
+    """События подписчика в WebSocket (по сообщению на событие), пока клиент не отключится."""
+    receiver = asyncio.create_task(websocket.receive())
+    try:
+        while True:
+            getter = asyncio.create_task(subscriber.queue.get())
+            await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                event = getter.result()
+                if event is None:
+                    await websocket.close(code=1013, reason="Subscriber is too slow")
+                    return
+                await websocket.send_text(event.data.decode())
+            else:
+                getter.cancel()
+            if receiver.done():
+                # Входящие сообщения клиента не нужны — ждём только закрытия
+                if receiver.result()["type"] == "websocket.disconnect":
+                    return
+                receiver = asyncio.create_task(websocket.receive())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        ad_feed.unsubscribe(subscriber)
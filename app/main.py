@@ -0,0 +1,46 @@
+"""
+Запуск API в продакшене: несколько воркеров uvicorn на uvloop и httptools.
+
+    python main.py --workers 4 --port 8000
+
+Каждый воркер при старте прогревает пулы БД, горячие запросы и сериализаторы
+(см. warmup.py); балансировщику стоит направлять трафик по /health/ready.
+"""
+import argparse
+import os
+import uvicorn
+from config import SERVER_HOST, SERVER_PORT, SERVER_WORKERS
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the API with multiple uvicorn workers")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--graceful-timeout", type=int, default=10,
+                        help="seconds to wait for open streams (/ads/stream) on shutdown")
+    parser.add_argument("--access-log", action="store_true", help="log every request (off for throughput)")
+    parser.add_argument("--forwarded-allow-ips", default=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+                        help="proxies trusted to set X-Forwarded-For (client IP for rate limiting)")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        "app:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop",
+        http="httptools",
+        lifespan="on",
+        proxy_headers=True,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        log_level=args.log_level,
+        access_log=args.access_log,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+
+if __name__ == "__main__":
+    main()
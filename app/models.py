@@ -1,23 +1,22 @@
 import datetime
 import uuid
 from sqlalchemy import (
-    UUID, Boolean, Column, DateTime, ForeignKey, String, Table, UniqueConstraint, func, Text
+    UUID, BigInteger, Boolean, Column, Computed, DateTime, Float, ForeignKey, Index, Integer, LargeBinary, String, Table,
+    UniqueConstraint, func, Text, DDL, event
 )
-from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from config import POSTGRES_DB, POSTGRES_HOST, POSTGRES_PASSWORD, POSTGRES_PORT, POSTGRES_USER, SQL_DEBUG
-
-engine = create_async_engine(
-    f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}",
-    echo=SQL_DEBUG,
-)
-
-Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+# Session — для scripts.py, который исторически берёт его отсюда
+from db import async_session as Session  # noqa: F401
 
 
 class Base(AsyncAttrs, DeclarativeBase):
     pass
 
+# Конфигурация полнотекстового поиска по объявлениям (должна совпадать с миграцией)
+SEARCH_TS_CONFIG = "russian"
+
 role_rights = Table(
     "role_right_relation", Base.metadata,
     Column("role_id", ForeignKey("role.id"), index=True),
@@ -30,6 +29,16 @@ user_roles = Table(
     Column("role_id", ForeignKey("role.id"), index=True),
 )
 
+# Общие для всех воркеров token bucket'ы ограничителя запросов (ratelimit.PostgresBackend).
+# UNLOGGED: данные не нужны после сбоя, а запись не идёт в WAL
+rate_limit_buckets = Table(
+    "rate_limit_bucket", Base.metadata,
+    Column("key", String(200), primary_key=True),
+    Column("tokens", Float, nullable=False),
+    Column("updated_at", DateTime(timezone=True), nullable=False, index=True),
+    prefixes=["UNLOGGED"],
+)
+
 class Right(Base):
     __tablename__ = "right"
     __table_args__ = (
@@ -53,25 +62,129 @@ class User(Base):
     name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
     password: Mapped[str] = mapped_column(String(70), nullable=False)
     registration_time: Mapped[datetime.datetime] = mapped_column(DateTime, server_default=func.now())
-    tokens: Mapped[list["Token"]] = relationship("Token", back_populates="user", cascade="all, delete-orphan", lazy="joined")
+    # Токены копятся со временем — никогда не загружаем их неявно, удаляет их ON DELETE CASCADE
+    tokens: Mapped[list["Token"]] = relationship(
+        "Token", back_populates="user", cascade="all, delete-orphan", passive_deletes=True, lazy="raise"
+    )
     roles: Mapped[list[Role]] = relationship(secondary=user_roles, lazy="joined")
 
 class Token(Base):
     __tablename__ = "token"
     id: Mapped[int] = mapped_column(primary_key=True)
     token: Mapped[uuid.UUID] = mapped_column(UUID, server_default=func.gen_random_uuid(), unique=True)
-    creation_time: Mapped[datetime.datetime] = mapped_column(DateTime, server_default=func.now())
-    user_id: Mapped[int] = mapped_column(ForeignKey("todo_user.id"))
+    creation_time: Mapped[datetime.datetime] = mapped_column(DateTime, server_default=func.now(), index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("todo_user.id", ondelete="CASCADE"), index=True)
     user: Mapped[User] = relationship(User, back_populates="tokens", lazy="joined")
 
+class TokenRevocation(Base):
+    """
+    Отзыв JWT: одного токена (token_digest) или всех токенов пользователя,
+    выданных до revoked_at (user_id). Воркеры периодически подтягивают новые записи.
+    """
+    __tablename__ = "token_revocation"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    token_digest: Mapped[bytes] = mapped_column(LargeBinary(32), nullable=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("todo_user.id", ondelete="CASCADE"), nullable=True)
+    revoked_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    expires_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
 class Advertisement(Base):
     __tablename__ = "advertisement"
+    __table_args__ = (
+        Index("ix_advertisement_created_at_id", "created_at", "id"),
+        Index("ix_advertisement_updated_at_id", "updated_at", "id"),
+        # Объявления автора по страницам и их число (index-only scan)
+        Index("ix_advertisement_author_id_created_at_id", "author_id", "created_at", "id"),
+        Index("ix_advertisement_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_advertisement_title_trgm", "title",
+            postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_advertisement_description_trgm", "description",
+            postgresql_using="gin", postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(255), nullable=False)
     description: Mapped[str] = mapped_column(Text, nullable=True)
     price: Mapped[float] = mapped_column(nullable=False)
     created_at: Mapped[datetime.datetime] = mapped_column(DateTime, server_default=func.now())
+    # Меняется при изменении содержимого (вместе с version), но не при сбросе просмотров
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now())
     author_id: Mapped[int] = mapped_column(ForeignKey("todo_user.id"), nullable=False)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
+    # Просмотры копятся в памяти воркеров и сбрасываются пачками (см. counters.py)
+    views: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, server_default="0")
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            f"setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        deferred=True,
+    )
     author: Mapped[User] = relationship(User, back_populates="advertisements")
 
-User.advertisements = relationship("Advertisement", back_populates="author", cascade="all, delete-orphan", lazy="joined")
\ No newline at end of file
+# Загружать все объявления пользователя вместе с ним дорого — только явно: options(selectinload(User.advertisements))
+User.advertisements = relationship("Advertisement", back_populates="author", cascade="all, delete-orphan", lazy="raise")
+
+
+class AdvertisementDeletion(Base):
+    """Журнал удалений объявлений для ленты изменений; пишется триггером при любом DELETE."""
+    __tablename__ = "advertisement_deletion"
+    __table_args__ = (
+        Index("ix_advertisement_deletion_deleted_at_id", "deleted_at", "id"),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True)
+    ad_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    deleted_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now())
+
+
+# Канал NOTIFY с событиями об объявлениях (см. livefeed.py)
+AD_CHANGES_CHANNEL = "advertisement_changes"
+
+# Те же триггеры создают миграции; здесь — для баз, создаваемых через create_all
+for ddl in (
+    "CREATE OR REPLACE FUNCTION log_advertisement_deletion() RETURNS trigger LANGUAGE plpgsql AS $$ "
+    "BEGIN INSERT INTO advertisement_deletion (ad_id) SELECT id FROM deleted_rows; RETURN NULL; END $$",
+    "CREATE TRIGGER advertisement_deletion_log AFTER DELETE ON advertisement "
+    "REFERENCING OLD TABLE AS deleted_rows FOR EACH STATEMENT EXECUTE FUNCTION log_advertisement_deletion()",
+    # Одно уведомление на оператор, а не на строку: массовые операции и COPY не заваливают
+    # очередь NOTIFY и подписчиков (см. livefeed.AdFeed._on_notify)
+    "CREATE OR REPLACE FUNCTION notify_advertisement_change() RETURNS trigger LANGUAGE plpgsql AS $$ "
+    "DECLARE ids integer[]; payload text; "
+    "BEGIN "
+    "IF TG_OP = 'INSERT' THEN SELECT array_agg(id) INTO ids FROM new_rows; "
+    "ELSIF TG_OP = 'DELETE' THEN SELECT array_agg(id) INTO ids FROM old_rows; "
+    # Сброс счётчика просмотров не меняет version и событий не порождает
+    "ELSE SELECT array_agg(n.id) INTO ids FROM new_rows n JOIN old_rows o ON o.id = n.id "
+    "WHERE n.version IS DISTINCT FROM o.version; "
+    "END IF; "
+    "IF ids IS NULL THEN RETURN NULL; END IF; "
+    # NOTIFY ограничен 8000 байтами: больше 40 объявлений целиком в него не помещается
+    "IF TG_OP <> 'DELETE' AND cardinality(ids) <= 40 THEN "
+    "SELECT json_build_object('op', lower(TG_OP), 'ads', json_agg(json_build_object("
+    "'title', title, 'description', description, 'price', price, 'id', id, "
+    "'created_at', created_at, 'author_id', author_id, 'views', views, 'updated_at', updated_at"
+    ")))::text INTO payload FROM new_rows WHERE id = ANY(ids); "
+    "IF octet_length(payload) <= 7900 THEN "
+    f"PERFORM pg_notify('{AD_CHANGES_CHANNEL}', payload); RETURN NULL; "
+    "END IF; "
+    "END IF; "
+    "FOR payload IN SELECT json_build_object('op', lower(TG_OP), 'ids', json_agg(id ORDER BY id))::text "
+    "FROM (SELECT id, (row_number() OVER (ORDER BY id) - 1) / 500 AS part FROM unnest(ids) AS id) AS parts "
+    "GROUP BY part "
+    f"LOOP PERFORM pg_notify('{AD_CHANGES_CHANNEL}', payload); END LOOP; "
+    "RETURN NULL; "
+    "END $$",
+    "CREATE TRIGGER advertisement_notify_insert AFTER INSERT ON advertisement "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_advertisement_change()",
+    "CREATE TRIGGER advertisement_notify_update AFTER UPDATE ON advertisement "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION notify_advertisement_change()",
+    "CREATE TRIGGER advertisement_notify_delete AFTER DELETE ON advertisement "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION notify_advertisement_change()",
+):
+    event.listen(Advertisement.__table__, "after_create", DDL(ddl).execute_if(dialect="postgresql"))
@@ -0,0 +1,158 @@
+import datetime
+import logging
+from abc import ABC, abstractmethod
+import math
+import time
+from collections import OrderedDict, defaultdict
+from typing import Optional
+from fastapi import HTTPException, Request
+from sqlalchemy import Float, String, bindparam, delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from config import (
+    RATE_LIMIT_BACKEND, RATE_LIMIT_ENABLED, RATE_LIMIT_IDLE_TTL, RATE_LIMIT_MAX_KEYS,
+)
+from db import engine
+from dependencies import UserDependency
+from models import rate_limit_buckets as buckets
+
+logger = logging.getLogger(__name__)
+
+
+def parse_limit(spec: str) -> Optional[tuple[float, float]]:
+    """"N/S" -> (скорость пополнения в токенах/с, ёмкость N); пусто или "0" — без ограничения."""
+    if not spec or spec.strip() == "0":
+        return None
+    count, seconds = spec.split("/", 1)
+    return int(count) / float(seconds), float(count)
+
+
+class RateLimitBackend(ABC):
+    """Хранилище token bucket'ов. acquire возвращает 0, если запрос пропущен, иначе сколько секунд ждать."""
+
+    @abstractmethod
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        ...
+
+    async def purge(self) -> int:
+        """Удаление давно неиспользуемых bucket'ов."""
+        return 0
+
+
+class MemoryBackend(RateLimitBackend):
+    """Bucket'ы в памяти воркера; при переполнении вытесняются давно неиспользуемые (LRU)."""
+
+    def __init__(self, maxsize: int = RATE_LIMIT_MAX_KEYS):
+        self.maxsize = maxsize
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class PostgresBackend(RateLimitBackend):
+    """
+    Общие для всех воркеров bucket'ы в UNLOGGED-таблице rate_limit_bucket.
+    Пополнение и списание — один INSERT ... ON CONFLICT DO UPDATE; если токенов
+    не хватает, строка не меняется и второй запрос читает время ожидания.
+    """
+
+    def __init__(self, db_engine: AsyncEngine = engine, idle_ttl: float = RATE_LIMIT_IDLE_TTL):
+        self.engine = db_engine
+        self.idle_ttl = idle_ttl
+        key = bindparam("bucket_key", type_=String)
+        rate = bindparam("rate", type_=Float)
+        burst = bindparam("burst", type_=Float)
+        refilled = func.least(
+            burst, buckets.c.tokens + func.extract("epoch", func.clock_timestamp() - buckets.c.updated_at) * rate
+        )
+        stmt = insert(buckets).values(key=key, tokens=burst - 1, updated_at=func.clock_timestamp())
+        self._take = stmt.on_conflict_do_update(
+            index_elements=[buckets.c.key],
+            set_={"tokens": refilled - 1, "updated_at": func.clock_timestamp()},
+            where=refilled >= 1,
+        ).returning(buckets.c.tokens)
+        self._wait = select((1 - refilled) / rate).where(buckets.c.key == key)
+
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        params = {"bucket_key": key, "rate": rate, "burst": burst}
+        async with self.engine.begin() as conn:
+            if (await conn.execute(self._take, params)).first() is not None:
+                return 0.0
+            wait = await conn.scalar(self._wait, params)
+        return max(float(wait or 0), 0.001)
+
+    async def purge(self) -> int:
+        """Bucket без обращений дольше idle_ttl секунд заведомо полон — удалять его безопасно."""
+        cutoff = func.clock_timestamp() - datetime.timedelta(seconds=self.idle_ttl)
+        async with self.engine.begin() as conn:
+            return (await conn.execute(delete(buckets).where(buckets.c.updated_at < cutoff))).rowcount
+
+
+def make_backend(name: str = RATE_LIMIT_BACKEND) -> RateLimitBackend:
+    if name == "postgres":
+        return PostgresBackend()
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND {name!r}")
+
+
+backend = make_backend()
+# Имя лимита -> {"allowed": n, "limited": n}
+limit_stats: defaultdict[str, dict] = defaultdict(lambda: {"allowed": 0, "limited": 0})
+
+
+async def check_limit(name: str, key: str, rate: float, burst: float) -> None:
+    """Списывает токен из bucket'а name:key; 429 с Retry-After, если токенов нет."""
+    try:
+        wait = await backend.acquire(f"{name}:{key}", rate, burst)
+    except Exception:
+        # Недоступность общего хранилища не должна класть API — пропускаем запрос
+        logger.exception("Rate limit backend failed, allowing request")
+        return
+    stats = limit_stats[name]
+    if not wait:
+        stats["allowed"] += 1
+        return
+    stats["limited"] += 1
+    raise HTTPException(
+        status_code=429, detail="Too many requests", headers={"Retry-After": str(math.ceil(wait))}
+    )
+
+
+def limit_by_ip(name: str, spec: str):
+    """Зависимость маршрута: лимит spec на IP клиента (за прокси — uvicorn --proxy-headers)."""
+    limit = parse_limit(spec) if RATE_LIMIT_ENABLED else None
+
+    async def dependency(request: Request) -> None:
+        if limit is not None:
+            await check_limit(name, request.client.host if request.client else "unknown", *limit)
+
+    return dependency
+
+
+def limit_by_user(name: str, spec: str):
+    """Зависимость маршрута: лимит spec на аутентифицированного пользователя."""
+    limit = parse_limit(spec) if RATE_LIMIT_ENABLED else None
+
+    async def dependency(current_user: UserDependency) -> None:
+        if limit is not None:
+            await check_limit(name, str(current_user.id), *limit)
+
+    return dependency
+
+
+def get_stats() -> dict:
+    return {"enabled": RATE_LIMIT_ENABLED, "backend": type(backend).__name__, "limits": dict(limit_stats)}
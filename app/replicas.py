@@ -0,0 +1,112 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import (
+    DB_REPLICA_DSNS, DB_REPLICA_HEALTH_TIMEOUT, DB_REPLICA_MAX_LAG, READ_YOUR_WRITES_WINDOW,
+)
+from db import async_session, make_engine, pool_stats
+
+logger = logging.getLogger(__name__)
+
+LAST_WRITE_COOKIE = "db_last_write"
+
+LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class Replica:
+    def __init__(self, dsn: str):
+        self.engine: AsyncEngine = make_engine(dsn)
+        self.session: async_sessionmaker[AsyncSession] = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.healthy = True
+        self.lag: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        url = self.engine.url
+        return f"{url.host}:{url.port}/{url.database}"
+
+    async def check(self) -> None:
+        """Реплика здорова, если отвечает за DB_REPLICA_HEALTH_TIMEOUT и отстаёт не больше DB_REPLICA_MAX_LAG."""
+        try:
+            async with self.engine.connect() as conn:
+                lag = await asyncio.wait_for(conn.scalar(LAG_QUERY), DB_REPLICA_HEALTH_TIMEOUT)
+            self.lag = float(lag or 0)
+            healthy = self.lag <= DB_REPLICA_MAX_LAG
+        except Exception as exc:
+            logger.warning("Replica %s health check failed: %s", self.name, exc)
+            self.lag = None
+            healthy = False
+        if healthy != self.healthy:
+            logger.warning("Replica %s is now %s", self.name, "healthy" if healthy else "unhealthy")
+        self.healthy = healthy
+
+
+replicas = [Replica(dsn) for dsn in DB_REPLICA_DSNS]
+_round_robin = itertools.count()
+
+
+async def check_replicas() -> None:
+    await asyncio.gather(*(replica.check() for replica in replicas))
+
+
+def in_write_window(conn: HTTPConnection) -> bool:
+    """Клиент недавно писал — его чтения должны видеть собственные изменения."""
+    last_write = conn.cookies.get(LAST_WRITE_COOKIE)
+    try:
+        return last_write is not None and time.time() - float(last_write) < READ_YOUR_WRITES_WINDOW
+    except ValueError:
+        return False
+
+
+def read_sessionmaker(conn: HTTPConnection) -> async_sessionmaker[AsyncSession]:
+    """
+    Фабрика сессий для чтения: здоровая реплика по кругу, либо primary,
+    если реплик нет, все нездоровы или клиент в окне read-your-writes.
+    """
+    if not replicas or in_write_window(conn):
+        return async_session
+    healthy = [replica for replica in replicas if replica.healthy]
+    if not healthy:
+        return async_session
+    return healthy[next(_round_robin) % len(healthy)].session
+
+
+def replica_stats() -> list[dict]:
+    return [
+        {"name": replica.name, "healthy": replica.healthy, "lag": replica.lag, "pool": pool_stats(replica.engine)}
+        for replica in replicas
+    ]
+
+
+class ReadYourWritesMiddleware:
+    """После успешного изменяющего запроса ставит cookie с временем записи."""
+
+    SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in self.SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                MutableHeaders(scope=message).append(
+                    "Set-Cookie",
+                    f"{LAST_WRITE_COOKIE}={time.time():.3f}; Max-Age={READ_YOUR_WRITES_WINDOW}; Path=/; HttpOnly",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
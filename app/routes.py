@@ -1,5 +1,7 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from passlib.context import CryptContext
+import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response, WebSocket, status
+from fastapi.responses import StreamingResponse
 import crud
 import schemas
 import dependencies
@@ -9,37 +11,91 @@ from dependencies import UserDependency, get_db, get_current_user
 from models import User, Role
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from auth import create_access_token, verify_access_token
+import db as database
+import hashing
+import ratelimit
+import compression
+import exporter
+import importer
+import replicas
+from livefeed import ad_feed, sse_stream, websocket_stream
+from counters import view_counter
+import auth
+from auth import (
+    check_password, create_access_token, hash_password, invalidate_permissions, permission_cache, verify_access_token
+)
+from config import (
+    ADS_BULK_MAX, ADS_PAGE_LIMIT, ADS_PAGE_MAX_LIMIT, ADS_STREAM_CHUNK_SIZE, RATE_LIMIT_EXPORT, RATE_LIMIT_LOGIN,
+    RATE_LIMIT_READ, RATE_LIMIT_WRITE,
+)
 from fastapi.security import OAuth2PasswordBearer
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+login_limit = Depends(ratelimit.limit_by_ip("login", RATE_LIMIT_LOGIN))
+read_limit = Depends(ratelimit.limit_by_ip("read", RATE_LIMIT_READ))
+write_limit = Depends(ratelimit.limit_by_user("write", RATE_LIMIT_WRITE))
+export_limit = Depends(ratelimit.limit_by_ip("export", RATE_LIMIT_EXPORT))
 
-@router.post("/users/register")
+
+@router.post("/users/register", dependencies=[login_limit])
 async def register_user(user_data: UserRegister, db: dependencies.SessionDependency):
     """Регистрация нового пользователя."""
-    hashed_password = pwd_context.hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     user = User(name=user_data.name, password=hashed_password)
     db.add(user)
     await db.commit()
     return {"detail": "User registered"}
 
 
-@router.post("/users/login")
+@router.post("/users/login", dependencies=[login_limit])
 async def login_user(db: dependencies.SessionDependency, user_data: UserRegister):
     """Авторизация пользователя."""
     result = await db.execute(select(User).where(User.name == user_data.name))
     user = result.unique().scalar_one_or_none()
-    if not user or not pwd_context.verify(user_data.password, user.password):
+    if not user or not await check_password(user_data.password, user.password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     access_token = await create_access_token(user.id)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@router.post("/users/logout")
+async def logout_user(db: dependencies.SessionDependency, token: str = Depends(oauth2_scheme)):
+    """Отзыв текущего токена."""
+    await auth.revoke_token(db, token)
+    return {"detail": "Token revoked"}
+
+
+@router.post("/users/logout-all")
+async def logout_user_everywhere(db: dependencies.SessionDependency, current_user: UserDependency):
+    """Отзыв всех токенов текущего пользователя."""
+    await auth.revoke_user_tokens(db, current_user.id)
+    return {"detail": "All tokens revoked"}
+
+
+@router.get("/users/me/ads", response_model=list[crud.AdvertisementResponse], dependencies=[read_limit])
+async def list_my_advertisements(
+    db: dependencies.ReadSessionDependency,
+    current_user: UserDependency,
+    limit: int = Query(ADS_PAGE_LIMIT, ge=1, le=ADS_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+):
+    """
+    Объявления текущего пользователя (от новых к старым) с keyset-пагинацией.
+    Курсор следующей страницы — в заголовке X-Next-Cursor, общее число — в X-Total-Count.
+    """
+    try:
+        body, next_cursor = await schemas.get_author_ads(db, current_user.id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    response = _json_page(body, next_cursor)
+    response.headers["X-Total-Count"] = str(await schemas.count_author_ads(db, current_user.id))
+    return response
+
+
 @router.post("/roles/assign")
 async def assign_role(user_id: int, role_id: int, db: dependencies.SessionDependency):
     """Назначение роли пользователю."""
@@ -49,42 +105,272 @@ async def assign_role(user_id: int, role_id: int, db: dependencies.SessionDepend
         raise HTTPException(status_code=404, detail="User or Role not found")
     user.roles.append(role)
     await db.commit()
+    invalidate_permissions(user_id)
     return {"detail": "Role assigned"}
 
 
 @router.get("/roles/")
-async def list_roles(db: dependencies.SessionDependency):
+async def list_roles(db: dependencies.ReadSessionDependency):
     """Получение списка ролей."""
     result = await db.execute(select(Role))
     return result.scalars().all()
 
 
-@router.post("/ads/", response_model=crud.AdvertisementResponse)
+@router.post("/ads/", response_model=crud.AdvertisementResponse, dependencies=[write_limit])
 async def create_advertisement(
     ad: crud.AdvertisementCreate, 
     db: dependencies.SessionDependency, 
-    current_user: User = Depends(get_current_user),
+    current_user: UserDependency,
 ):
     """Создание объявления."""
     return await schemas.create_ad(db, ad, user_id=current_user.id)
 
 
+def _check_bulk_size(items: list) -> None:
+    if len(items) > ADS_BULK_MAX:
+        raise HTTPException(status_code=413, detail=f"Too many items, max {ADS_BULK_MAX}")
+
+
+@router.post("/ads/bulk", response_model=list[crud.BulkItemResult], dependencies=[write_limit])
+async def bulk_create_advertisements(
+    ads: list[crud.AdvertisementCreate],
+    db: dependencies.SessionDependency,
+    current_user: UserDependency,
+):
+    """Массовое создание объявлений."""
+    _check_bulk_size(ads)
+    created = await schemas.bulk_create_ads(db, ads, user_id=current_user.id)
+    return [
+        crud.BulkItemResult(index=index, id=ad.id, status="created", ad=ad)
+        for index, ad in enumerate(created)
+    ]
+
+
+@router.put("/ads/bulk", response_model=list[crud.BulkItemResult], dependencies=[write_limit])
+async def bulk_update_advertisements(
+    ads: list[crud.AdvertisementBulkUpdate],
+    db: dependencies.SessionDependency,
+    current_user: UserDependency,
+):
+    """Массовое обновление объявлений (только своих)."""
+    _check_bulk_size(ads)
+    if len({ad.id for ad in ads}) != len(ads):
+        raise HTTPException(status_code=400, detail="Duplicate advertisement ids")
+    updated = await schemas.bulk_update_ads(db, ads, user_id=current_user.id)
+    return [
+        crud.BulkItemResult(index=index, id=ad.id, status="updated", ad=updated[ad.id])
+        if ad.id in updated
+        else crud.BulkItemResult(index=index, id=ad.id, status="not_found")
+        for index, ad in enumerate(ads)
+    ]
+
+
+@router.delete("/ads/bulk", response_model=list[crud.BulkItemResult], dependencies=[write_limit])
+async def bulk_delete_advertisements(
+    ad_ids: list[int],
+    db: dependencies.SessionDependency,
+    current_user: UserDependency,
+):
+    """Массовое удаление объявлений (только своих)."""
+    _check_bulk_size(ad_ids)
+    deleted = await schemas.bulk_delete_ads(db, list(set(ad_ids)), user_id=current_user.id)
+    return [
+        crud.BulkItemResult(index=index, id=ad_id, status="deleted" if ad_id in deleted else "not_found")
+        for index, ad_id in enumerate(ad_ids)
+    ]
+
+
+@router.post("/ads/import", response_model=crud.ImportResult, dependencies=[write_limit])
+async def import_advertisements(
+    request: Request,
+    current_user: UserDependency,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+):
+    """
+    Потоковый импорт объявлений из тела запроса: CSV с заголовком (title, description, price)
+    или NDJSON. Формат — параметр format или Content-Type (text/csv, application/x-ndjson).
+    В ответе — число загруженных строк и ошибки по номерам строк.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        if "csv" in content_type:
+            format = "csv"
+        elif "json" in content_type:
+            format = "ndjson"
+        else:
+            raise HTTPException(status_code=415, detail="Expected text/csv or application/x-ndjson")
+    return await importer.import_ads(request.stream(), format, author_id=current_user.id)
+
+
+@router.get("/ads/export", dependencies=[export_limit])
+async def export_advertisements(
+    session_factory: dependencies.ReadSessionmakerDependency,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    author_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    created_from: Optional[datetime.datetime] = None,
+    created_to: Optional[datetime.datetime] = None,
+):
+    """
+    Выгрузка каталога объявлений потоком (COPY ... TO STDOUT) в CSV или NDJSON, при gzip=true — сжатая.
+    Фильтры: автор, диапазон цен, created_at в [created_from, created_to). Порядок строк не задан.
+    """
+    filters = exporter.ExportFilter(author_id, min_price, max_price, created_from, created_to)
+    filename = f"ads.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        exporter.stream_export(session_factory, format, filters, gzip=gzip),
+        media_type="application/gzip" if gzip else exporter.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/ads/search", response_model=list[crud.AdvertisementResponse], dependencies=[read_limit])
+async def search_advertisements(
+    db: dependencies.ReadSessionDependency,
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    limit: int = Query(ADS_PAGE_LIMIT, ge=1, le=ADS_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+):
+    """
+    Поиск объявлений по тексту (заголовок и описание) и диапазону цен.
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+    """
+    try:
+        body, next_cursor = await schemas.search_advertisements(db, q, min_price, max_price, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return _json_page(body, next_cursor)
+
+
+@router.get("/ads/changes", dependencies=[read_limit])
+async def advertisement_changes(
+    db: dependencies.SessionDependency,
+    since: Optional[str] = None,
+    limit: int = Query(ADS_PAGE_LIMIT, ge=1, le=ADS_PAGE_MAX_LIMIT),
+):
+    """
+    Изменения объявлений после курсора since: [{"op": "upsert", "ad": {...}} | {"op": "delete", "id": ...}].
+    Курсор для следующего запроса — в заголовке X-Next-Cursor; пустой массив — изменений пока нет.
+    Читается с primary: на реплике с задержкой часть изменений можно пропустить.
+    """
+    try:
+        body, next_cursor = await schemas.get_ad_changes(db, limit, since)
+    except schemas.CursorExpiredError:
+        raise HTTPException(status_code=410, detail="Cursor expired, full resync required")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return _json_page(body, next_cursor)
+
+
+@router.get("/ads/stream", dependencies=[read_limit])
+async def advertisement_stream_sse(
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
+):
+    """
+    Живая лента объявлений (Server-Sent Events): insert/update/delete по мере изменений;
+    оператор, изменивший сразу много объявлений, — одно событие bulk ({"op", "ids"}).
+    Фильтры: диапазон цен и подстрока в заголовке. Отстающий клиент получает event: overflow и отключается.
+    """
+    subscriber = ad_feed.subscribe(min_price, max_price, q)
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="Too many subscribers", headers={"Retry-After": "5"})
+    return StreamingResponse(
+        sse_stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ads/stream")
+async def advertisement_stream_websocket(
+    websocket: WebSocket,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
+):
+    """Живая лента объявлений через WebSocket: одно JSON-сообщение на событие."""
+    subscriber = ad_feed.subscribe(min_price, max_price, q)
+    if subscriber is None:
+        await websocket.close(code=1013, reason="Too many subscribers")
+        return
+    await websocket.accept()
+    await websocket_stream(websocket, subscriber)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Слабое сравнение ETag из If-None-Match (RFC 9110, 13.1.2)."""
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
 @router.get("/ads/{ad_id}", response_model=crud.AdvertisementResponse)
-async def get_advertisement(ad_id: int, db: dependencies.SessionDependency):
-    """Получение объявления по ID."""
-    ad = await schemas.get_ad_by_id(db, ad_id)
-    if not ad:
+async def get_advertisement(
+    ad_id: int,
+    request: Request,
+    db: dependencies.ReadSessionDependency,
+    if_none_match: Optional[str] = Header(None),
+):
+    """Получение объявления по ID (поддерживает ETag / If-None-Match)."""
+    # Автор сразу после записи читает с primary и мимо кеша
+    cached = await schemas.get_ad_cached(db, ad_id, refresh=replicas.in_write_window(request))
+    if not cached:
         raise HTTPException(status_code=404, detail="Advertisement not found")
-    return ad
+    view_counter.hit(ad_id)
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if if_none_match and _etag_matches(if_none_match, cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
 
+def _json_page(body: bytes, next_cursor: Optional[str]) -> Response:
+    """
+    Ответ с уже сериализованной страницей объявлений.
+    response_model у маршрутов остаётся для схемы OpenAPI, но повторно не валидируется.
+    """
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return Response(content=body, media_type="application/json", headers=headers)
 
-@router.get("/ads/", response_model=list[crud.AdvertisementResponse])
-async def list_advertisements(db: dependencies.SessionDependency):
-    """Получение списка всех объявлений."""
-    return await schemas.get_all_ads(db)
 
+@router.get("/ads/", response_model=list[crud.AdvertisementResponse], dependencies=[read_limit])
+async def list_advertisements(
+    db: dependencies.ReadSessionDependency,
+    session_factory: dependencies.ReadSessionmakerDependency,
+    limit: Optional[int] = Query(None, ge=1, le=ADS_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+):
+    """
+    Получение списка объявлений (от новых к старым) с keyset-пагинацией.
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+    При stream=true объявления отдаются целиком в формате NDJSON.
+    """
+    try:
+        if cursor:
+            schemas.decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if stream:
+        return StreamingResponse(
+            schemas.stream_all_ads(cursor, limit, ADS_STREAM_CHUNK_SIZE, session_factory),
+            media_type="application/x-ndjson",
+        )
 
-@router.put("/ads/{ad_id}", response_model=AdvertisementResponse)
+    body, next_cursor = await schemas.get_all_ads(db, limit or ADS_PAGE_LIMIT, cursor)
+    return _json_page(body, next_cursor)
+
+
+@router.put("/ads/{ad_id}", response_model=AdvertisementResponse, dependencies=[write_limit])
 async def update_ad_endpoint(
     ad_id: int,
     ad_data: AdvertisementUpdate,
@@ -102,7 +388,7 @@ async def update_ad_endpoint(
     return updated_ad
 
 
-@router.delete("/ads/{ad_id}")
+@router.delete("/ads/{ad_id}", dependencies=[write_limit])
 async def delete_advertisement(
     ad_id: int,
     db: dependencies.SessionDependency,
@@ -120,3 +406,71 @@ async def delete_advertisement(
 @router.get("/users/me")
 async def get_current_user_info(current_user: UserDependency):
     return {"id": current_user.id, "name": current_user.name}
+
+
+@router.get("/health/live")
+async def liveness():
+    """Процесс жив и обслуживает запросы."""
+    return {"status": "ok"}
+
+
+@router.get("/health/ready")
+async def readiness(request: Request):
+    """Воркер прогрет и готов к трафику; до этого — 503."""
+    if not getattr(request.app.state, "ready", False):
+        return Response(
+            content=b'{"status":"warming up"}', status_code=503, media_type="application/json",
+            headers={"Retry-After": "1"},
+        )
+    return {"status": "ready"}
+
+
+@router.get("/metrics/hashing")
+async def hashing_metrics():
+    """Метрики пула bcrypt: глубина очереди и время хеширования."""
+    return hashing.get_stats()
+
+
+@router.get("/metrics/cache")
+async def cache_metrics():
+    """Статистика in-process кешей."""
+    return {
+        "tokens": auth.token_stats(),
+        "principal": dependencies.principal_cache.stats(),
+        "permissions": permission_cache.stats(),
+        "ads": schemas.ad_cache.stats(),
+        "author_counts": schemas.author_count_cache.stats(),
+    }
+
+
+@router.get("/metrics/views")
+async def views_metrics():
+    """Буфер счётчика просмотров этого воркера."""
+    return view_counter.stats()
+
+
+@router.get("/metrics/rate-limit")
+async def rate_limit_metrics():
+    """Пропущенные и отклонённые запросы по лимитам."""
+    return ratelimit.get_stats()
+
+
+@router.get("/metrics/compression")
+async def compression_metrics():
+    """Сжатые ответы по кодировкам, объём до/после и попадания в кеш сжатых страниц."""
+    return compression.get_stats()
+
+
+@router.get("/metrics/live-feed")
+async def live_feed_metrics():
+    """LISTEN-соединение и подписчики живой ленты этого воркера."""
+    return ad_feed.stats()
+
+
+@router.get("/metrics/db-pool")
+async def db_pool_metrics():
+    """Состояние пулов соединений с БД (primary и реплики)."""
+    return {
+        "primary": database.pool_stats(database.engine),
+        "replicas": replicas.replica_stats(),
+    }
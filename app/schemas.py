@@ -1,8 +1,26 @@
-from sqlalchemy.ext.asyncio import AsyncSession
+import base64
+import datetime
+from dataclasses import dataclass
+import orjson
+from sqlalchemy import (
+    Boolean, Float, Integer, String, Text, any_, case, cast, column, delete, func, insert, literal, literal_column, or_,
+    tuple_, update, values,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.future import select
-from models import Advertisement
-from crud import AdvertisementCreate, AdvertisementUpdate, AdvertisementResponse
-from typing import List, Optional
+from cache import TTLCache
+from config import (
+    AD_CACHE_SIZE, AD_CACHE_TTL, ADS_CHANGES_RETENTION_DAYS, ADS_CHANGES_SETTLE, AUTHOR_COUNT_CACHE_SIZE,
+    AUTHOR_COUNT_CACHE_TTL,
+)
+from db import async_session
+from models import Advertisement, AdvertisementDeletion, SEARCH_TS_CONFIG
+from statements import (
+    AD_BY_ID, AD_COLUMNS, AD_COUNT_BY_AUTHOR, AD_DELETE, MARK_BULK_READ, OLDEST_TRANSACTION_START, ad_update,
+)
+from crud import AdvertisementBulkUpdate, AdvertisementCreate, AdvertisementUpdate, AdvertisementResponse
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
 from pydantic import BaseModel
 
 class UserRegister(BaseModel):
@@ -10,76 +28,434 @@ class UserRegister(BaseModel):
     password: str
 
 
+@dataclass(frozen=True)
+class CachedAd:
+    """Сериализованное объявление с ETag, готовое к отдаче клиенту"""
+    etag: str
+    body: bytes
+    version: int
+
+
+# ad_id -> CachedAd; обновляется в update_ad/bulk_update_ads и сбрасывается в delete_ad этого воркера,
+# в остальных — по TTL
+ad_cache = TTLCache(maxsize=AD_CACHE_SIZE, ttl=AD_CACHE_TTL)
+# author_id -> число объявлений; сбрасывается при создании и удалении объявлений автора на этом воркере
+author_count_cache = TTLCache(maxsize=AUTHOR_COUNT_CACHE_SIZE, ttl=AUTHOR_COUNT_CACHE_TTL)
+
+
+def make_etag(ad_id: int, version: int, views: int) -> str:
+    # views входит в тело ответа: без него после сброса просмотров клиент получал бы 304 со старым счётчиком
+    return f'"{ad_id}-{version}-{views}"'
+
+
+AD_FIELDS = tuple(column.key for column in AD_COLUMNS)
+
+
+def ad_json(row) -> bytes:
+    """JSON одного объявления из строки AD_COLUMNS без валидации Pydantic"""
+    return orjson.dumps(dict(zip(AD_FIELDS, row)))
+
+
+def ads_json(rows: Sequence) -> bytes:
+    """JSON-массив объявлений из строк AD_COLUMNS без валидации Pydantic"""
+    return orjson.dumps([dict(zip(AD_FIELDS, row)) for row in rows])
+
+
 async def create_ad(db: AsyncSession, ad_data: AdvertisementCreate, user_id: int) -> AdvertisementResponse:
-    """Создание объявления"""
-    new_ad = Advertisement(
-        title=ad_data.title,
-        description=ad_data.description,
-        price=ad_data.price,
-        author_id=user_id,
+    """Создание объявления (один INSERT ... RETURNING)"""
+    stmt = (
+        insert(Advertisement)
+        .values(
+            title=ad_data.title,
+            description=ad_data.description,
+            price=ad_data.price,
+            author_id=user_id,
+        )
+        .returning(*AD_COLUMNS)
     )
-    db.add(new_ad)
+    row = (await db.execute(stmt)).one()
     await db.commit()
-    await db.refresh(new_ad)
-    return AdvertisementResponse.model_validate(new_ad)
+    author_count_cache.pop(user_id)
+    return AdvertisementResponse.model_validate(row)
 
 
-async def get_all_ads(db: AsyncSession) -> List[AdvertisementResponse]:
-    """Получение списка всех объявлений"""
-    result = await db.execute(select(Advertisement))
-    ads = result.scalars().all()
-    return [AdvertisementResponse.model_validate(ad) for ad in ads]
+def encode_cursor(created_at: datetime.datetime, ad_id: int) -> str:
+    """Кодирование курсора пагинации из (created_at, id)"""
+    raw = f"{created_at.isoformat()}|{ad_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
 
-async def get_ad_by_id(db: AsyncSession, ad_id: int) -> Optional[AdvertisementResponse]:
-    """Получение объявления по ID"""
-    result = await db.execute(select(Advertisement).where(Advertisement.id == ad_id))
-    ad = result.scalar_one_or_none()
-    if ad:
-        return AdvertisementResponse.model_validate(ad)
-    return None
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    """Декодирование курсора пагинации; ValueError при некорректном значении"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, ad_id = raw.split("|", 1)
+        created_at = datetime.datetime.fromisoformat(created_at)
+        # created_at — timestamp without time zone: с aware-значением asyncpg не свяжет параметр
+        if created_at.tzinfo is not None:
+            raise ValueError("Cursor timestamp must not have a time zone")
+        return created_at, int(ad_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
 
 
-async def update_ad(db: AsyncSession, ad_id: int, ad_data: AdvertisementUpdate, user_id: int) -> Optional[AdvertisementResponse]:
-    """Обновление объявления (пользователь может редактировать только свои объявления)"""
-    result = await db.execute(select(Advertisement).where(Advertisement.id == ad_id, Advertisement.author_id == user_id))
-    ad = result.scalar_one_or_none()
+def _ads_after(cursor: Optional[str]):
+    """Запрос объявлений в порядке (created_at, id) от новых к старым, начиная после курсора"""
+    query = select(*AD_COLUMNS).order_by(Advertisement.created_at.desc(), Advertisement.id.desc())
+    if cursor:
+        created_at, ad_id = decode_cursor(cursor)
+        query = query.where(tuple_(Advertisement.created_at, Advertisement.id) < tuple_(created_at, ad_id))
+    return query
 
-    if not ad:
-        return None
 
-    for key, value in ad_data.dict(exclude_unset=True).items():
-        setattr(ad, key, value)
+async def _page(db: AsyncSession, query, limit: int) -> Tuple[bytes, Optional[str]]:
+    """Страница строк AD_COLUMNS в JSON и курсор следующей страницы"""
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return ads_json(rows), next_cursor
+
+
+async def get_all_ads(
+    db: AsyncSession, limit: int, cursor: Optional[str] = None
+) -> Tuple[bytes, Optional[str]]:
+    """Получение страницы объявлений (готовый JSON) и курсора следующей страницы"""
+    return await _page(db, _ads_after(cursor), limit)
+
 
+async def stream_all_ads(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    chunk_size: int = 500,
+    session_factory: async_sessionmaker[AsyncSession] = async_session,
+) -> AsyncIterator[bytes]:
+    """Потоковое чтение объявлений через серверный курсор: один кусок NDJSON на chunk_size строк"""
+    query = _ads_after(cursor)
+    if limit is not None:
+        query = query.limit(limit)
+    # Сессия открывается здесь, а не в зависимости: она должна жить, пока отдаётся ответ
+    async with session_factory() as session:
+        # Транзакция открыта, пока клиент читает ответ, — ленту изменений она не задерживает
+        await session.execute(MARK_BULK_READ)
+        result = await session.stream(query.execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            yield b"".join(ad_json(row) + b"\n" for row in rows)
+
+
+async def get_author_ads(
+    db: AsyncSession, author_id: int, limit: int, cursor: Optional[str] = None
+) -> Tuple[bytes, Optional[str]]:
+    """Страница объявлений автора (от новых к старым) по индексу (author_id, created_at, id)"""
+    return await _page(db, _ads_after(cursor).where(Advertisement.author_id == author_id), limit)
+
+
+async def count_author_ads(db: AsyncSession, author_id: int) -> int:
+    """Число объявлений автора (кешируется на AUTHOR_COUNT_CACHE_TTL)"""
+    count = author_count_cache.get(author_id)
+    if count is None:
+        count = (await db.execute(AD_COUNT_BY_AUTHOR, {"author_id": author_id})).scalar_one()
+        author_count_cache.set(author_id, count)
+    return count
+
+
+def _cache_ad(ad) -> CachedAd:
+    """
+    Кладёт объявление (строка или модель с version) в ad_cache.
+    Запись более новой версии не заменяется: чтение с отстающей реплики,
+    начатое до update_ad, не должно вернуть в кеш старое тело.
+    """
+    cached = CachedAd(
+        etag=make_etag(ad.id, ad.version, ad.views),
+        body=AdvertisementResponse.model_validate(ad).model_dump_json().encode(),
+        version=ad.version,
+    )
+    current = ad_cache.peek(ad.id)
+    if current is not None and current.version > cached.version:
+        return current
+    ad_cache.set(ad.id, cached)
+    return cached
+
+
+async def get_ad_cached(db: AsyncSession, ad_id: int, refresh: bool = False) -> Optional[CachedAd]:
+    """Получение сериализованного объявления через read-through кеш (refresh — читать мимо кеша)"""
+    cached = None if refresh else ad_cache.get(ad_id)
+    if cached is None:
+        result = await db.execute(AD_BY_ID, {"ad_id": ad_id})
+        ad = result.scalar_one_or_none()
+        if not ad:
+            return None
+        cached = _cache_ad(ad)
+    return cached
+
+
+async def update_ad(db: AsyncSession, ad_id: int, ad_data: AdvertisementUpdate, user_id: int) -> Optional[AdvertisementResponse]:
+    """
+    Обновление объявления (пользователь может редактировать только свои объявления).
+    Проверка владельца и обновление — один UPDATE ... RETURNING.
+    """
+    fields = ad_data.model_dump(exclude_unset=True)
+    if not fields:
+        # Менять нечего: без записи version, updated_at, ETag и лента изменений остаются прежними
+        cached = await get_ad_cached(db, ad_id)
+        if cached is None:
+            return None
+        ad = AdvertisementResponse.model_validate_json(cached.body)
+        return ad if ad.author_id == user_id else None
+    params = {f"new_{name}": value for name, value in fields.items()}
+    stmt = ad_update(tuple(sorted(fields)))
+    row = (await db.execute(stmt, {"ad_id": ad_id, "user_id": user_id, **params})).one_or_none()
     await db.commit()
-    await db.refresh(ad)
-    return AdvertisementResponse.model_validate(ad)
+
+    if not row:
+        return None
+
+    # Новая версия с primary сразу в кеш (а не сброс): см. _cache_ad
+    _cache_ad(row)
+    return AdvertisementResponse.model_validate(row)
 
 
 async def delete_ad(db: AsyncSession, ad_id: int, user_id: int) -> bool:
-    """Удаление объявления (только автор может удалить)"""
-    result = await db.execute(select(Advertisement).where(Advertisement.id == ad_id, Advertisement.author_id == user_id))
-    ad = result.scalar_one_or_none()
+    """Удаление объявления (только автор может удалить) одним DELETE ... RETURNING"""
+    deleted_id = (await db.execute(AD_DELETE, {"ad_id": ad_id, "user_id": user_id})).scalar_one_or_none()
+    await db.commit()
 
-    if not ad:
+    if deleted_id is None:
         return False
 
-    await db.delete(ad)
-    await db.commit()
+    ad_cache.pop(ad_id)
+    author_count_cache.pop(user_id)
     return True
 
 
-async def search_advertisements(db: AsyncSession, title: Optional[str] = None, min_price: Optional[float] = None, max_price: Optional[float] = None) -> List[AdvertisementResponse]:
-    """Поиск объявлений по заголовку и цене"""
-    query = select(Advertisement)
+async def bulk_create_ads(
+    db: AsyncSession, ads_data: List[AdvertisementCreate], user_id: int
+) -> List[AdvertisementResponse]:
+    """Массовое создание объявлений одним INSERT ... RETURNING (порядок как во входных данных)"""
+    if not ads_data:
+        return []
+    rows = [{**ad.model_dump(), "author_id": user_id} for ad in ads_data]
+    result = await db.execute(
+        insert(Advertisement).returning(*AD_COLUMNS, sort_by_parameter_order=True), rows
+    )
+    created = [AdvertisementResponse.model_validate(row) for row in result.all()]
+    await db.commit()
+    author_count_cache.pop(user_id)
+    return created
+
+
+async def bulk_update_ads(
+    db: AsyncSession, ads_data: List[AdvertisementBulkUpdate], user_id: int
+) -> dict[int, AdvertisementResponse]:
+    """
+    Массовое обновление объявлений пользователя одним UPDATE ... FROM (VALUES ...).
+    Возвращает обновлённые объявления по id; чужих и несуществующих в ответе нет.
+    """
+    if not ads_data:
+        return {}
+    rows = []
+    for ad in ads_data:
+        fields = ad.model_dump(exclude_unset=True)
+        rows.append((
+            ad.id,
+            fields.get("title"),
+            fields.get("description"),
+            fields.get("price"),
+            fields.get("title") is not None,
+            "description" in fields,
+            fields.get("price") is not None,
+        ))
+    data = values(
+        column("id", Integer),
+        column("title", String),
+        column("description", Text),
+        column("price", Float),
+        column("set_title", Boolean),
+        column("set_description", Boolean),
+        column("set_price", Boolean),
+        name="data",
+    ).data(rows)
+    # NULL в VALUES не несут типа — приводим явно, иначе колонка из одних NULL станет text
+    stmt = (
+        update(Advertisement)
+        .where(Advertisement.id == data.c.id, Advertisement.author_id == user_id)
+        .values(
+            title=case((data.c.set_title, cast(data.c.title, String)), else_=Advertisement.title),
+            description=case((data.c.set_description, cast(data.c.description, Text)), else_=Advertisement.description),
+            price=case((data.c.set_price, cast(data.c.price, Float)), else_=Advertisement.price),
+            version=Advertisement.version + 1,
+            updated_at=func.now(),
+        )
+        .returning(*AD_COLUMNS, Advertisement.version)
+        .execution_options(synchronize_session=False)
+    )
+    rows = (await db.execute(stmt)).all()
+    await db.commit()
+    for row in rows:
+        _cache_ad(row)
+    return {row.id: AdvertisementResponse.model_validate(row) for row in rows}
+
+
+async def bulk_delete_ads(db: AsyncSession, ad_ids: List[int], user_id: int) -> set[int]:
+    """Массовое удаление объявлений пользователя одним DELETE ... WHERE id = ANY(...)"""
+    if not ad_ids:
+        return set()
+    stmt = (
+        delete(Advertisement)
+        .where(Advertisement.id == any_(literal(ad_ids, ARRAY(Integer))), Advertisement.author_id == user_id)
+        .returning(Advertisement.id)
+        .execution_options(synchronize_session=False)
+    )
+    deleted = set((await db.scalars(stmt)).all())
+    await db.commit()
+    for ad_id in deleted:
+        ad_cache.pop(ad_id)
+    if deleted:
+        author_count_cache.pop(user_id)
+    return deleted
+
+
+def encode_search_cursor(rank: float, ad_id: int) -> str:
+    """Кодирование курсора поисковой выдачи из (rank, id)"""
+    raw = f"{rank!r}|{ad_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, int]:
+    """Декодирование курсора поисковой выдачи; ValueError при некорректном значении"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        rank, ad_id = raw.split("|", 1)
+        return float(rank), int(ad_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+async def search_advertisements(
+    db: AsyncSession,
+    title: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> Tuple[bytes, Optional[str]]:
+    """
+    Поиск объявлений по тексту и цене.
+    Текст ищется по tsvector (title + description) и подстроке через pg_trgm,
+    результаты упорядочены по релевантности. Без текста — как список, от новых к старым.
+    Возвращает готовый JSON-массив и курсор следующей страницы.
+    """
+    price_filters = []
+    if min_price is not None:
+        price_filters.append(Advertisement.price >= min_price)
+    if max_price is not None:
+        price_filters.append(Advertisement.price <= max_price)
+
+    if not title:
+        return await _page(db, _ads_after(cursor).where(*price_filters), limit)
+
+    ts_query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_TS_CONFIG}'::regconfig"), title)
+    rank = (func.ts_rank_cd(Advertisement.search_vector, ts_query) + func.similarity(Advertisement.title, title)).label("rank")
+    query = (
+        select(*AD_COLUMNS, rank)
+        .where(
+            or_(
+                Advertisement.search_vector.op("@@")(ts_query),
+                Advertisement.title.icontains(title, autoescape=True),
+                Advertisement.description.icontains(title, autoescape=True),
+            ),
+            *price_filters,
+        )
+        .order_by(rank.desc(), Advertisement.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        last_rank, last_id = decode_search_cursor(cursor)
+        query = query.where(tuple_(rank, Advertisement.id) < tuple_(last_rank, last_id))
+
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_search_cursor(rows[-1].rank, rows[-1].id)
+    return ads_json(rows), next_cursor
+
+
+# Порядок событий в ленте с одинаковым временем: сначала изменения, потом удаления
+CHANGE_UPSERT, CHANGE_DELETE = 0, 1
+
+
+class CursorExpiredError(ValueError):
+    """Курсор старше срока хранения журнала удалений — нужна полная синхронизация."""
+
+
+def encode_changes_cursor(changed_at: datetime.datetime, kind: int, item_id: int) -> str:
+    """Кодирование курсора ленты изменений из (время изменения, тип события, id)"""
+    raw = f"{changed_at.isoformat()}|{kind}|{item_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_changes_cursor(cursor: str) -> Tuple[datetime.datetime, int, int]:
+    """Декодирование курсора ленты изменений; ValueError при некорректном значении"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        changed_at, kind, item_id = raw.split("|", 2)
+        changed_at = datetime.datetime.fromisoformat(changed_at)
+        if changed_at.tzinfo is not None:
+            raise ValueError("Cursor timestamp must not have a time zone")
+        return changed_at, int(kind), int(item_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+async def get_ad_changes(
+    db: AsyncSession, limit: int, cursor: Optional[str] = None
+) -> Tuple[bytes, Optional[str]]:
+    """
+    Лента изменений объявлений после курсора: созданные и изменённые (op=upsert)
+    и удалённые (op=delete) в порядке (время, тип, id).
+    Возвращает готовый JSON-массив и курсор, с которого продолжать; без курсора — с начала.
+    updated_at и deleted_at — now() записавшей транзакции, то есть время её начала, а не COMMIT:
+    лента не заходит дальше начала самой старой открытой транзакции, иначе строки долгой
+    транзакции, закоммиченные позже, оказались бы позади выданного курсора.
+    """
+    settled = func.least(func.now() - datetime.timedelta(seconds=ADS_CHANGES_SETTLE), OLDEST_TRANSACTION_START)
+    upserts = select(*AD_COLUMNS).where(Advertisement.updated_at < settled)
+    deletes = select(AdvertisementDeletion).where(AdvertisementDeletion.deleted_at < settled)
+
+    if cursor:
+        changed_at, kind, item_id = decode_changes_cursor(cursor)
+        retention = func.localtimestamp() - datetime.timedelta(days=ADS_CHANGES_RETENTION_DAYS)
+        if await db.scalar(select(literal(changed_at) < retention)):
+            raise CursorExpiredError("Cursor is older than the deletion log retention")
+        if kind == CHANGE_UPSERT:
+            upserts = upserts.where(tuple_(Advertisement.updated_at, Advertisement.id) > tuple_(changed_at, item_id))
+            deletes = deletes.where(AdvertisementDeletion.deleted_at >= changed_at)
+        else:
+            upserts = upserts.where(Advertisement.updated_at > changed_at)
+            deletes = deletes.where(
+                tuple_(AdvertisementDeletion.deleted_at, AdvertisementDeletion.id) > tuple_(changed_at, item_id)
+            )
+
+    upserted = (
+        await db.execute(upserts.order_by(Advertisement.updated_at, Advertisement.id).limit(limit))
+    ).all()
+    deleted = (
+        await db.scalars(deletes.order_by(AdvertisementDeletion.deleted_at, AdvertisementDeletion.id).limit(limit))
+    ).all()
 
-    if title:
-        query = query.where(Advertisement.title.ilike(f"%{title}%"))
-    if min_price:
-        query = query.where(Advertisement.price >= min_price)
-    if max_price:
-        query = query.where(Advertisement.price <= max_price)
+    # (ключ порядка, тело события); из двух отсортированных выборок берём первые limit
+    events = [
+        ((row.updated_at, CHANGE_UPSERT, row.id), {"op": "upsert", "ad": dict(zip(AD_FIELDS, row))})
+        for row in upserted
+    ]
+    events += [
+        ((item.deleted_at, CHANGE_DELETE, item.id), {"op": "delete", "id": item.ad_id, "deleted_at": item.deleted_at})
+        for item in deleted
+    ]
+    events.sort(key=lambda event: event[0])
+    events = events[:limit]
 
-    result = await db.execute(query)
-    ads = result.scalars().all()
-    return [AdvertisementResponse.model_validate(ad) for ad in ads]
+    next_cursor = encode_changes_cursor(*events[-1][0]) if events else cursor
+    return orjson.dumps([body for _, body in events]), next_cursor
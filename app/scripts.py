@@ -1,4 +1,4 @@
-from auth import hash_password
+from auth import hash_password, invalidate_permissions
 from models import Right, Role, Session, User
 
 
@@ -27,9 +27,10 @@ async def create_admin_user(
     ]
     rights = [*write_rights, *read_rights]
     role = Role(name="admin", rights=rights)
-    user = User(name=username, password=hash_password(password), roles=[role])
+    user = User(name=username, password=await hash_password(password), roles=[role])
     session.add_all([*rights, role, user])
     await session.commit()
+    invalidate_permissions()
 
 
 async def create_user_role(session: Session) -> None:
@@ -47,3 +48,4 @@ async def create_user_role(session: Session) -> None:
     role = Role(name="user", rights=rights)
     session.add_all([*rights, role])
     await session.commit()
+    invalidate_permissions()
@@ -0,0 +1,107 @@
+"""
+Заранее собранные выражения для горячих запросов.
+
+Конструкция select()/update()/delete() строится один раз при импорте, значения
+передаются через bindparam при выполнении. SQLAlchemy не собирает дерево заново
+на каждый вызов, а текст SQL остаётся одним и тем же — поэтому он же служит
+ключом кеша подготовленных выражений asyncpg (DB_PREPARED_STATEMENT_CACHE_SIZE).
+Выражения с переменным набором условий собираются по одному на вариант и кешируются.
+"""
+from functools import lru_cache
+from sqlalchemy import bindparam, column, delete, func, select, table, update
+from models import Advertisement, Right, Role, Token, User, role_rights, user_roles
+
+# Колонки, из которых собирается AdvertisementResponse (в порядке полей модели)
+AD_COLUMNS = (
+    Advertisement.title,
+    Advertisement.description,
+    Advertisement.price,
+    Advertisement.id,
+    Advertisement.created_at,
+    Advertisement.author_id,
+    Advertisement.views,
+    Advertisement.updated_at,
+)
+
+# Параметры: ad_id
+AD_BY_ID = select(Advertisement).where(Advertisement.id == bindparam("ad_id"))
+
+# Параметры: ad_id, user_id
+AD_DELETE = (
+    delete(Advertisement)
+    .where(Advertisement.id == bindparam("ad_id"), Advertisement.author_id == bindparam("user_id"))
+    .returning(Advertisement.id)
+    .execution_options(synchronize_session=False)
+)
+
+# Параметры: author_id
+AD_COUNT_BY_AUTHOR = select(func.count()).select_from(Advertisement).where(
+    Advertisement.author_id == bindparam("author_id")
+)
+
+# application_name на время длинных транзакций, которые только читают (потоковый список, выгрузка).
+# set_config(..., true) действует до конца транзакции: соединение возвращается в пул с прежним именем
+BULK_READ_APPLICATION_NAME = "ads-bulk-read"
+MARK_BULK_READ = select(func.set_config("application_name", BULK_READ_APPLICATION_NAME, True))
+
+# Начало самой старой открытой транзакции в этой базе (NULL, если таких нет).
+# Сессии других ролей без pg_read_all_stats видны с xact_start = NULL и не учитываются;
+# читающие транзакции с BULK_READ_APPLICATION_NAME ничего не пишут и тоже пропускаются
+_activity = table("pg_stat_activity", column("datname"), column("xact_start"), column("application_name"))
+OLDEST_TRANSACTION_START = (
+    select(func.min(_activity.c.xact_start))
+    .where(
+        _activity.c.datname == func.current_database(),
+        _activity.c.application_name != BULK_READ_APPLICATION_NAME,
+    )
+    .scalar_subquery()
+)
+
+# Параметры: token, since
+TOKEN_BY_VALUE = select(Token).where(
+    Token.token == bindparam("token"),
+    Token.creation_time >= bindparam("since"),
+)
+
+
+@lru_cache(maxsize=None)
+def ad_update(fields: tuple[str, ...]):
+    """
+    UPDATE ... RETURNING (AD_COLUMNS и version) для набора изменяемых полей (отсортированный кортеж имён).
+    Параметры: ad_id, user_id и new_<поле> для каждого поля.
+    """
+    return (
+        update(Advertisement)
+        .where(Advertisement.id == bindparam("ad_id"), Advertisement.author_id == bindparam("user_id"))
+        .values(
+            **{name: bindparam(f"new_{name}") for name in fields},
+            version=Advertisement.version + 1,
+            updated_at=func.now(),
+        )
+        .returning(*AD_COLUMNS, Advertisement.version)
+        .execution_options(synchronize_session=False)
+    )
+
+
+@lru_cache(maxsize=None)
+def access_rights(write: bool, read: bool, not_own: bool):
+    """
+    Число прав пользователя на модель с учётом флагов; по выражению на комбинацию флагов.
+    Параметры: user_id, model.
+    """
+    where_args = [User.id == bindparam("user_id"), Right.model == bindparam("model")]
+    if write:
+        where_args.append(Right.write.is_(True))
+    if read:
+        where_args.append(Right.read.is_(True))
+    if not_own:
+        where_args.append(Right.only_own.is_(False))
+
+    return (
+        select(func.count(User.id))
+        .join(user_roles, user_roles.c.user_id == User.id)
+        .join(Role, Role.id == user_roles.c.role_id)
+        .join(role_rights, role_rights.c.role_id == Role.id)
+        .join(Right, Right.id == role_rights.c.right_id)
+        .where(*where_args)
+    )
@@ -0,0 +1,69 @@
+import asyncio
+import datetime
+import logging
+from typing import Awaitable, Callable
+from sqlalchemy import delete, func, select
+from config import ADS_CHANGES_RETENTION_DAYS, TOKEN_PURGE_BATCH, TOKEN_PURGE_PAUSE, TOKEN_TTL
+from db import async_session
+from models import AdvertisementDeletion, Token, TokenRevocation
+
+logger = logging.getLogger(__name__)
+
+
+async def purge_expired_tokens() -> int:
+    """
+    Удаляет просроченные токены пачками по TOKEN_PURGE_BATCH строк.
+    Каждая пачка — отдельная короткая транзакция; строки, заблокированные
+    другим воркером, пропускаются (SKIP LOCKED).
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=TOKEN_TTL)
+    expired_ids = (
+        select(Token.id)
+        .where(Token.creation_time < cutoff)
+        .limit(TOKEN_PURGE_BATCH)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    stmt = delete(Token).where(Token.id.in_(expired_ids)).execution_options(synchronize_session=False)
+
+    total = 0
+    while True:
+        async with async_session() as session:
+            deleted = (await session.execute(stmt)).rowcount
+            await session.commit()
+        total += deleted
+        if deleted < TOKEN_PURGE_BATCH:
+            break
+        await asyncio.sleep(TOKEN_PURGE_PAUSE)
+
+    if total:
+        logger.info("Purged %d expired tokens", total)
+    return total
+
+
+async def purge_token_revocations() -> int:
+    """Удаляет отзывы, относящиеся к уже истёкшим токенам."""
+    async with async_session() as session:
+        deleted = (await session.execute(delete(TokenRevocation).where(TokenRevocation.expires_at < func.now()))).rowcount
+        await session.commit()
+    return deleted
+
+
+async def purge_ad_deletions() -> int:
+    """Удаляет записи журнала удалений старше ADS_CHANGES_RETENTION_DAYS."""
+    cutoff = func.localtimestamp() - datetime.timedelta(days=ADS_CHANGES_RETENTION_DAYS)
+    async with async_session() as session:
+        stmt = delete(AdvertisementDeletion).where(AdvertisementDeletion.deleted_at < cutoff)
+        deleted = (await session.execute(stmt)).rowcount
+        await session.commit()
+    return deleted
+
+
+async def run_periodically(job: Callable[[], Awaitable], interval: float) -> None:
+    """Запускает job каждые interval секунд до отмены задачи."""
+    while True:
+        try:
+            await job()
+        except Exception:
+            logger.exception("Periodic job %s failed", job.__name__)
+        await asyncio.sleep(interval)
@@ -0,0 +1,32 @@
+import os
+import socket
+import sys
+import pytest
+
+# Модули приложения импортируются по имени (from config import ...), как при запуске из app/
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+from config import POSTGRES_HOST, POSTGRES_PORT  # noqa: E402
+
+
+def _postgres_reachable() -> bool:
+    try:
+        with socket.create_connection((POSTGRES_HOST, int(POSTGRES_PORT)), timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+@pytest.fixture(scope="session")
+def postgres():
+    """Тесты с этой фикстурой пропускаются, если PostgreSQL недоступен."""
+    if not _postgres_reachable():
+        pytest.skip(f"PostgreSQL is not reachable at {POSTGRES_HOST}:{POSTGRES_PORT}")
+
+
+@pytest.fixture
+def anyio_backend():
+    # Приложение рассчитано на asyncio (asyncpg, uvloop)
+    return "asyncio"
@@ -1,14 +1,144 @@
+import datetime
+import time
+import uuid
+from types import SimpleNamespace
+import pytest
 from fastapi.testclient import TestClient
 from app.app import app
+from counters import view_counter
+import schemas
+import warmup
 
-client = TestClient(app)
 
-def test_read_ads():
+@pytest.fixture(scope="module")
+def client(postgres):
+    # Один event loop на все запросы: соединения пула привязаны к нему
+    with TestClient(app) as client:
+        yield client
+
+
+def test_read_ads(client):
     response = client.get("/ads")
     assert response.status_code == 200
     assert isinstance(response.json(), list)
 
-def test_create_ad():
-    response = client.post("/ads", json={"title": "Тест", "description": "Описание", "price": 5000})
-    assert response.status_code == 201
+
+def _login(client) -> dict:
+    credentials = {"name": f"test-{uuid.uuid4().hex[:12]}", "password": "password123"}
+    assert client.post("/users/register", json=credentials).status_code == 200
+    token = client.post("/users/login", json=credentials).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="module")
+def auth_headers(client):
+    # Создавать объявления может только вошедший пользователь
+    return _login(client)
+
+
+def test_create_ad(client, auth_headers):
+    response = client.post(
+        "/ads", json={"title": "Тест", "description": "Описание", "price": 5000}, headers=auth_headers,
+    )
+    assert response.status_code == 200
     assert response.json()["title"] == "Тест"
+
+
+def test_update_refreshes_cached_ad(client, auth_headers):
+    ad_id = client.post("/ads/", json={"title": "До", "price": 1}, headers=auth_headers).json()["id"]
+    assert client.get(f"/ads/{ad_id}").json()["title"] == "До"
+    assert client.put(f"/ads/{ad_id}", json={"title": "После"}, headers=auth_headers).status_code == 200
+    response = client.get(f"/ads/{ad_id}")
+    assert response.json()["title"] == "После"
+    assert response.headers["etag"].startswith(f'"{ad_id}-2-')
+
+
+def test_tz_aware_cursor_is_bad_request(client):
+    cursor = schemas.encode_cursor(datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc), 1)
+    assert client.get("/ads/", params={"cursor": cursor}).status_code == 400
+
+
+def test_etag_changes_with_views(client):
+    ad_id = client.get("/ads/", params={"limit": 1}).json()[0]["id"]
+    first = client.get(f"/ads/{ad_id}")
+    client.portal.call(view_counter.flush)
+    schemas.ad_cache.pop(ad_id)
+    response = client.get(f"/ads/{ad_id}", headers={"If-None-Match": first.headers["etag"]})
+    assert response.status_code == 200
+    assert response.json()["views"] > first.json()["views"]
+    assert response.headers["etag"] != first.headers["etag"]
+
+
+def test_export_with_aware_dates(client):
+    response = client.get("/ads/export", params={"created_from": "2000-01-01T00:00:00Z", "format": "ndjson"})
+    assert response.status_code == 200
+    assert all(line.startswith("{") for line in response.text.splitlines())
+
+
+def test_empty_update_does_not_write(client, auth_headers):
+    ad = client.post("/ads/", json={"title": "Без изменений", "price": 1}, headers=auth_headers).json()
+    response = client.put(f"/ads/{ad['id']}", json={}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == ad
+    # version не увеличилась
+    assert client.get(f"/ads/{ad['id']}").headers["etag"].startswith(f'"{ad["id"]}-1-')
+
+
+def test_empty_update_of_foreign_ad_is_not_found(client, auth_headers):
+    ad_id = client.post("/ads/", json={"title": "Чужое", "price": 1}, headers=auth_headers).json()["id"]
+    response = client.put(f"/ads/{ad_id}", json={}, headers=_login(client))
+    assert response.status_code == 404
+
+
+def test_readiness_after_warmup(client):
+    deadline = time.monotonic() + 10
+    while client.get("/health/ready").status_code != 200:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    assert client.get("/health/ready").json() == {"status": "ready"}
+    app.state.ready = False
+    try:
+        response = client.get("/health/ready")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+        assert client.get("/health/live").status_code == 200
+    finally:
+        app.state.ready = True
+
+
+@pytest.mark.anyio
+async def test_warmup_retries_until_it_succeeds(monkeypatch):
+    attempts = []
+
+    async def flaky_warm_up(app):
+        attempts.append(app.state.ready)
+        if len(attempts) < 3:
+            raise ConnectionError("database is starting up")
+
+    monkeypatch.setattr(warmup, "warm_up", flaky_warm_up)
+    monkeypatch.setattr(warmup, "WARMUP_RETRY_INTERVAL", 0)
+    fake_app = SimpleNamespace(state=SimpleNamespace(ready=False))
+    await warmup.warm_up_until_ready(fake_app)
+    # Пока прогрев не удался, воркер не готов
+    assert attempts == [False, False, False]
+    assert fake_app.state.ready
+
+
+def test_my_ads_pages(client, auth_headers):
+    headers = _login(client)
+    own = [client.post("/ads/", json={"title": f"Моё {i}", "price": i}, headers=headers).json()["id"] for i in range(3)]
+    client.post("/ads/", json={"title": "Чужое", "price": 1}, headers=auth_headers)
+
+    first = client.get("/users/me/ads", params={"limit": 2}, headers=headers)
+    assert first.status_code == 200
+    assert [ad["id"] for ad in first.json()] == own[:0:-1]
+    assert first.headers["x-total-count"] == "3"
+    second = client.get(
+        "/users/me/ads", params={"limit": 2, "cursor": first.headers["x-next-cursor"]}, headers=headers,
+    )
+    assert [ad["id"] for ad in second.json()] == own[:1]
+    assert "x-next-cursor" not in second.headers
+    assert second.headers["x-total-count"] == "3"
+
+    assert client.get("/users/me/ads", params={"cursor": "oops"}, headers=headers).status_code == 400
+    assert client.get("/users/me/ads").status_code == 401
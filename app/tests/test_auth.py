@@ -0,0 +1,78 @@
+import datetime
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete
+import auth
+from db import async_session, engine
+from models import TokenRevocation
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    monkeypatch.setattr(auth, "token_cache", auth.TTLCache(maxsize=2, ttl=3600))
+    monkeypatch.setattr(auth, "_synced_until", None)
+    auth.revoked_tokens.clear()
+    auth.revoked_users.clear()
+    yield
+    auth.revoked_tokens.clear()
+    auth.revoked_users.clear()
+
+
+def _revocation(token: str, **fields) -> TokenRevocation:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    fields.setdefault("revoked_at", now)
+    return TokenRevocation(
+        token_digest=auth.token_digest(token), expires_at=now + datetime.timedelta(hours=1), **fields
+    )
+
+
+async def test_revocations_are_not_evicted():
+    token = await auth.create_access_token(1)
+    await auth.decode_access_token(token)
+    auth._apply_revocation(_revocation(token))
+    # Отзывов больше, чем помещается в кеш токенов: первый не должен потеряться
+    for i in range(auth.TOKEN_CACHE_SIZE + 1):
+        auth._apply_revocation(_revocation(f"token-{i}"))
+    with pytest.raises(HTTPException) as exc:
+        await auth.decode_access_token(token)
+    assert exc.value.status_code == 401
+
+
+async def test_user_revocation_applies_to_older_tokens():
+    token = await auth.create_access_token(7)
+    assert await auth.verify_access_token(token) == 7
+    revocation = TokenRevocation(
+        user_id=7,
+        revoked_at=datetime.datetime.now(datetime.timezone.utc),
+        expires_at=datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
+    )
+    assert auth._apply_revocation(revocation)
+    assert not auth._apply_revocation(revocation)
+    with pytest.raises(HTTPException):
+        await auth.decode_access_token(token)
+    assert await auth.verify_access_token(await auth.create_access_token(7)) == 7
+
+
+async def test_sync_picks_up_late_commits(postgres):
+    await engine.dispose()
+    token = await auth.create_access_token(1)
+    late = None
+    try:
+        await auth.sync_revocations()
+        # revoked_at раньше прошлой синхронизации: запись закоммитили уже после неё
+        late = _revocation(token, revoked_at=auth._synced_until - datetime.timedelta(seconds=1))
+        async with async_session() as session:
+            session.add(late)
+            await session.commit()
+        assert await auth.sync_revocations() == 1
+        assert auth.token_digest(token) in auth.revoked_tokens
+        # Перекрытие читается снова, но уже применённые отзывы не считаются
+        assert await auth.sync_revocations() == 0
+    finally:
+        if late is not None and late.id is not None:
+            async with async_session() as session:
+                await session.execute(delete(TokenRevocation).where(TokenRevocation.id == late.id))
+                await session.commit()
+        await engine.dispose()
@@ -0,0 +1,74 @@
+import time
+from cache import TTLCache
+
+
+def test_get_set_pop():
+    cache = TTLCache(maxsize=10, ttl=60)
+    assert cache.get("a") is None
+    assert cache.get("a", "default") == "default"
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    cache.pop("a")
+    cache.pop("missing")
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 3
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    # "b" использовался давнее всех
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_ttl_expiry(monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=1)
+    cache.set("c", 3, ttl=100)
+    now += 2
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    now += 4
+    # ttl записи не больше ttl кеша
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+
+
+def test_disabled_cache_stores_nothing():
+    assert len(_filled(TTLCache(maxsize=0, ttl=60))) == 0
+    assert len(_filled(TTLCache(maxsize=10, ttl=0))) == 0
+
+
+def _filled(cache: TTLCache) -> TTLCache:
+    cache.set("a", 1)
+    return cache
+
+
+def test_invalidate():
+    cache = TTLCache(maxsize=10, ttl=60)
+    for i in range(5):
+        cache.set(i, i * 10)
+    assert cache.invalidate(lambda key, value: key % 2 == 0 or value == 30) == 4
+    assert len(cache) == 1
+    assert cache.get(1) == 10
+
+
+def test_peek_does_not_touch_lru_or_stats():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.peek("a") == 1
+    assert cache.peek("missing", "default") == "default"
+    cache.set("c", 3)
+    assert cache.peek("a") is None
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
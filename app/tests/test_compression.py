@@ -0,0 +1,206 @@
+import asyncio
+import gzip
+import zlib
+import orjson
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from starlette.types import Message
+import compression
+from compression import CompressionMiddleware, choose_encoding, compression_stats, page_cache
+
+BODY = orjson.dumps([{"id": i, "title": f"Объявление {i}", "price": i * 10} for i in range(100)])
+ETAG = '"1-1-0"'
+
+api = FastAPI()
+page = {"body": BODY}
+
+
+@api.get("/ads/")
+async def ads_page():
+    return Response(page["body"], media_type="application/json", headers={"ETag": ETAG})
+
+
+@api.get("/small")
+async def small():
+    return Response(b'{"ok": true}', media_type="application/json")
+
+
+@api.get("/stream")
+async def stream():
+    async def lines():
+        for i in range(3):
+            yield orjson.dumps({"id": i}) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@api.get("/not-modified")
+async def not_modified():
+    return Response(status_code=304, headers={"ETag": ETAG})
+
+
+@api.get("/events")
+async def events():
+    async def sse():
+        yield b"event: insert\ndata: " + BODY + b"\n\n"
+
+    return StreamingResponse(sse(), media_type="text/event-stream")
+
+
+app = CompressionMiddleware(api, cache_paths=("/ads/",))
+client = TestClient(app)
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    page_cache.clear()
+    compression_stats.clear()
+    page["body"] = BODY
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, br, zstd", "zstd"),
+    ("gzip;q=1.0, br;q=0.8, zstd;q=0.5", "gzip"),
+    ("br;q=0.9, gzip;q=0.9", "br"),
+    ("zstd;q=0, gzip", "gzip"),
+    ("*;q=0.5, gzip;q=0.1", "zstd"),
+    ("*, zstd;q=0, br;q=0", "gzip"),
+    ("GZIP ; q=0.3", "gzip"),
+    ("gzip;q=oops", None),
+    ("identity", None),
+    ("", None),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header, ("zstd", "br", "gzip")) == expected
+
+
+def test_whole_body_is_compressed_and_etag_weakened():
+    response = client.get("/ads/", headers=GZIP)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == "W/" + ETAG
+    assert int(response.headers["content-length"]) < len(BODY)
+    assert response.content == BODY
+
+
+def test_identity_is_not_touched():
+    response = client.get("/ads/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == ETAG
+    assert response.content == BODY
+
+
+def test_small_body_is_not_compressed():
+    response = client.get("/small", headers=GZIP)
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_page_cache_hit_and_miss():
+    for _ in range(3):
+        assert client.get("/ads/", headers=GZIP).content == BODY
+    assert compression_stats["cache_misses"] == 1
+    assert compression_stats["cache_hits"] == 2
+    assert compression_stats["gzip"] == 1
+    assert len(page_cache) == 1
+    # Другой запрос — другая запись
+    client.get("/ads/?limit=10", headers=GZIP)
+    assert compression_stats["cache_misses"] == 2
+
+
+def test_page_cache_rechecks_body():
+    client.get("/ads/", headers=GZIP)
+    page["body"] = BODY.replace(b"title", b"name")
+    response = client.get("/ads/", headers=GZIP)
+    # Страница изменилась — кешированное сжатое тело не подходит
+    assert response.content == page["body"]
+    assert compression_stats["cache_hits"] == 0
+    assert compression_stats["cache_misses"] == 2
+
+
+def test_authorized_requests_bypass_page_cache():
+    for _ in range(2):
+        response = client.get("/ads/", headers={**GZIP, "Authorization": "Bearer token"})
+        assert response.headers["content-encoding"] == "gzip"
+    assert len(page_cache) == 0
+    assert compression_stats["gzip"] == 2
+    assert "cache_hits" not in compression_stats
+
+
+def test_not_modified_and_sse_pass_through():
+    response = client.get("/not-modified", headers=GZIP)
+    assert response.status_code == 304
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == ETAG
+
+    response = client.get("/events", headers=GZIP)
+    assert "content-encoding" not in response.headers
+    assert response.content.startswith(b"event: insert\n")
+
+
+def _stream_messages() -> list[Message]:
+    scope = {
+        "type": "http", "method": "GET", "path": "/stream", "raw_path": b"/stream", "root_path": "",
+        "scheme": "http", "query_string": b"", "headers": [(b"accept-encoding", b"gzip")],
+        "server": ("test", 80), "client": ("test", 1), "http_version": "1.1",
+    }
+    messages = []
+
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if requested:
+            # Клиент не отключается: ответ дочитывается до конца
+            await asyncio.Event().wait()
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start, *bodies = messages
+    headers = dict(start["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    assert compression_stats["gzip_streamed"] == 1
+    assert bodies[-1]["more_body"] is False
+    return bodies
+
+
+def test_small_stream_chunks_are_compressed_together():
+    bodies = _stream_messages()
+    # Три мелкие строки не набирают COMPRESSION_STREAM_FLUSH_SIZE — сброс только в конце
+    assert len(bodies) == 1
+    assert gzip.decompress(bodies[0]["body"]) == b"".join(orjson.dumps({"id": i}) + b"\n" for i in range(3))
+
+
+def test_stream_is_flushed_after_threshold(monkeypatch):
+    monkeypatch.setattr(compression, "COMPRESSION_STREAM_FLUSH_SIZE", 1)
+    bodies = _stream_messages()
+    # Каждый кусок распаковывается сразу, не дожидаясь конца потока
+    decompressor = zlib.decompressobj(wbits=31)
+    lines = [decompressor.decompress(message["body"]) for message in bodies]
+    assert lines[:3] == [orjson.dumps({"id": i}) + b"\n" for i in range(3)]
+    assert gzip.decompress(b"".join(message["body"] for message in bodies)) == b"".join(lines)
+
+
+@pytest.mark.skipif("br" not in compression.ENCODINGS, reason="brotli is not installed")
+def test_brotli_round_trip():
+    response = client.get("/ads/", headers={"Accept-Encoding": "br"})
+    assert response.headers["content-encoding"] == "br"
+    # httpx распаковывает br сам, если установлен brotli
+    assert response.content == BODY
+
+
+@pytest.mark.skipif("zstd" not in compression.ENCODINGS, reason="zstandard is not installed")
+def test_zstd_round_trip():
+    import zstandard
+    response = client.get("/ads/", headers={"Accept-Encoding": "zstd"})
+    assert response.headers["content-encoding"] == "zstd"
+    # httpx не распаковывает zstd — тело приходит как есть
+    assert zstandard.ZstdDecompressor().decompress(response.content) == BODY
@@ -0,0 +1,13 @@
+from counters import ViewCounter
+
+
+def test_buffer_is_bounded_by_ads():
+    counter = ViewCounter(maxsize=2)
+    for ad_id in (1, 1, 2, 3, 3, 1):
+        counter.hit(ad_id)
+    # Просмотры уже учтённых объявлений копятся, новые сверх лимита отбрасываются
+    assert counter.pending == {1: 3, 2: 1}
+    assert counter.dropped == 2
+    stats = counter.stats()
+    assert stats["pending_ads"] == 2
+    assert stats["pending_views"] == 4
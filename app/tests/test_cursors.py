@@ -0,0 +1,38 @@
+import datetime
+import pytest
+from schemas import (
+    decode_changes_cursor, decode_cursor, decode_search_cursor, encode_changes_cursor, encode_cursor,
+    encode_search_cursor,
+)
+
+CREATED_AT = datetime.datetime(2026, 10, 18, 12, 30, 45, 123456)
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(CREATED_AT, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (CREATED_AT, 42)
+
+
+def test_search_cursor_round_trip():
+    rank = 0.0607927106320858
+    assert decode_search_cursor(encode_search_cursor(rank, 7)) == (rank, 7)
+
+
+def test_changes_cursor_round_trip():
+    assert decode_changes_cursor(encode_changes_cursor(CREATED_AT, 1, 99)) == (CREATED_AT, 1, 99)
+
+
+@pytest.mark.parametrize("decode", [decode_cursor, decode_search_cursor, decode_changes_cursor])
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "////", "bm90LWEtZGF0ZXwx", "MjAyNi0xMC0xOFQxMjozMHx4"])
+def test_invalid_cursor(decode, cursor):
+    with pytest.raises(ValueError):
+        decode(cursor)
+
+
+def test_tz_aware_cursor_is_rejected():
+    aware = CREATED_AT.replace(tzinfo=datetime.timezone.utc)
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(aware, 1))
+    with pytest.raises(ValueError):
+        decode_changes_cursor(encode_changes_cursor(aware, 0, 1))
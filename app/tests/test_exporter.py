@@ -0,0 +1,27 @@
+import datetime
+from exporter import ExportFilter, copy_options, export_query
+
+
+def test_aware_dates_become_naive_utc():
+    moscow = datetime.timezone(datetime.timedelta(hours=3))
+    filters = ExportFilter(
+        created_from=datetime.datetime(2026, 10, 18, 3, 0, tzinfo=moscow),
+        created_to=datetime.datetime(2026, 10, 19),
+    )
+    assert filters.created_from == datetime.datetime(2026, 10, 18, 0, 0)
+    assert filters.created_from.tzinfo is None
+    assert filters.created_to == datetime.datetime(2026, 10, 19)
+
+
+def test_export_query_filters():
+    query = str(export_query("csv", ExportFilter(author_id=1, min_price=10, created_to=datetime.datetime(2026, 1, 1))))
+    assert "advertisement.author_id =" in query
+    assert "advertisement.price >=" in query
+    assert "advertisement.created_at <" in query
+    assert "row_to_json" in str(export_query("ndjson", ExportFilter()))
+
+
+def test_ndjson_copy_options_never_quote_json():
+    options = copy_options("ndjson")
+    assert options["format"] == "csv"
+    assert options["quote"] not in '{}[]",:\\' and options["delimiter"] not in '{}[]",:\\'
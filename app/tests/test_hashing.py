@@ -0,0 +1,38 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+import hashing
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def small_pool(monkeypatch):
+    monkeypatch.setattr(hashing, "HASH_WORKERS", 1)
+    monkeypatch.setattr(hashing, "HASH_QUEUE_SIZE", 1)
+    monkeypatch.setattr(hashing, "HASH_EXECUTOR", "thread")
+    hashing.shutdown()
+    yield
+    hashing.shutdown()
+
+
+async def test_hash_and_verify():
+    hashed = await hashing.hash_password("secret")
+    assert await hashing.verify_password("secret", hashed)
+    assert not await hashing.verify_password("wrong", hashed)
+    assert not await hashing.verify_password("secret", "not a bcrypt hash")
+
+
+async def test_rejects_when_queue_is_full():
+    hashed = hashing.hashpw(b"secret", hashing.gensalt(4)).decode()
+    rejected = hashing.get_stats()["rejected"]
+    # Воркер и место в очереди заняты первыми двумя, третий получает 503 сразу
+    results = await asyncio.gather(
+        *(hashing.verify_password("secret", hashed) for _ in range(3)), return_exceptions=True
+    )
+    assert results[:2] == [True, True]
+    assert isinstance(results[2], HTTPException)
+    assert results[2].status_code == 503
+    assert results[2].headers == {"Retry-After": "1"}
+    assert hashing.get_stats()["rejected"] == rejected + 1
+    assert hashing._pending == 0
@@ -0,0 +1,153 @@
+from typing import AsyncIterator, Iterable
+import pytest
+import importer
+from importer import ImportReport, RecordError, iter_csv, iter_lines, iter_ndjson
+
+pytestmark = pytest.mark.anyio
+
+
+async def _chunks(*chunks: bytes) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(iterator) -> list:
+    return [item async for item in iterator]
+
+
+async def _parse(parser, data: bytes, chunk_size: int = 7) -> list:
+    """Разбор data, нарезанного на куски по chunk_size байт (границы попадают внутрь строк и символов)."""
+    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+    return await _collect(parser(iter_lines(_chunks(*chunks))))
+
+
+def _records(parsed: Iterable) -> list:
+    return [(row, record) for row, record in parsed if not isinstance(record, Exception)]
+
+
+def _errors(parsed: Iterable) -> list:
+    return [(row, str(record)) for row, record in parsed if isinstance(record, Exception)]
+
+
+async def test_lines_strip_bom_and_crlf():
+    data = "\ufeffпервая\r\nвторая\r\n\r\nпоследняя".encode()
+    assert await _collect(iter_lines(_chunks(data[:2], data[2:5], data[5:]))) == ["первая", "вторая", "", "последняя"]
+
+
+async def test_lines_split_multibyte_characters():
+    data = "цена\nобъявление\n".encode()
+    chunks = [data[i:i + 1] for i in range(len(data))]
+    assert await _collect(iter_lines(_chunks(*chunks))) == ["цена", "объявление"]
+
+
+async def test_oversized_line(monkeypatch):
+    monkeypatch.setattr(importer, "ADS_IMPORT_MAX_RECORD", 10)
+    with pytest.raises(RecordError):
+        await _collect(iter_lines(_chunks(b"short\n", b"x" * 11)))
+
+
+async def test_csv_records():
+    data = "title,description,price\r\nВелосипед,,1500\r\n\r\nСамокат,Почти новый,900\r\n".encode()
+    assert await _parse(iter_csv, data) == [
+        (2, {"title": "Велосипед", "price": "1500"}),
+        (4, {"title": "Самокат", "description": "Почти новый", "price": "900"}),
+    ]
+
+
+async def test_csv_with_bom():
+    data = "\ufefftitle,price\nЛыжи,100\n".encode()
+    assert await _parse(iter_csv, data) == [(2, {"title": "Лыжи", "price": "100"})]
+
+
+async def test_csv_multiline_quoted_field():
+    data = (
+        'title,description,price\n'
+        'Стол,"Первая строка\r\nвторая, с запятой\nи ""кавычки""",300\n'
+        'Стул,,50\n'
+    ).encode()
+    parsed = await _parse(iter_csv, data)
+    assert parsed == [
+        (2, {"title": "Стол", "description": 'Первая строка\nвторая, с запятой\nи "кавычки"', "price": "300"}),
+        # Номер строки входа, а не записи: запись выше заняла три строки
+        (5, {"title": "Стул", "price": "50"}),
+    ]
+
+
+async def test_csv_row_errors_keep_line_numbers():
+    data = b'title,price\nok,1\nbad\nok,2,extra\n"open,3\n'
+    parsed = await _parse(iter_csv, data)
+    assert _records(parsed) == [(2, {"title": "ok", "price": "1"})]
+    assert _errors(parsed) == [
+        (3, "Expected 2 columns, got 1"),
+        (4, "Expected 2 columns, got 3"),
+        (5, "Unterminated quoted field"),
+    ]
+
+
+async def test_csv_header_without_required_columns():
+    with pytest.raises(RecordError, match="price"):
+        await _parse(iter_csv, b"title,description\nx,y\n")
+
+
+async def test_csv_oversized_quoted_record(monkeypatch):
+    monkeypatch.setattr(importer, "ADS_IMPORT_MAX_RECORD", 20)
+    data = b'title,price\n"' + b"long line\n" * 5
+    with pytest.raises(RecordError, match="Row 2"):
+        await _parse(iter_csv, data, chunk_size=4)
+
+
+async def test_ndjson_records_and_errors():
+    data = b'{"title": "a", "price": 1}\r\n\n[1, 2]\n{broken\n{"title": "b", "price": 2}'
+    parsed = await _parse(iter_ndjson, data)
+    assert _records(parsed) == [(1, {"title": "a", "price": 1}), (5, {"title": "b", "price": 2})]
+    assert [row for row, _ in _errors(parsed)] == [3, 4]
+    assert _errors(parsed)[0][1] == "Expected a JSON object"
+
+
+def test_report_caps_errors():
+    report = ImportReport(max_errors=2)
+    for row in range(1, 6):
+        report.fail(row, RecordError(f"bad {row}"))
+    report.fail(10, RecordError("batch rejected"), rows=100)
+    result = report.result()
+    assert result.failed == 105
+    assert [(error.row, error.error) for error in result.errors] == [(1, "bad 1"), (2, "bad 2")]
+    assert result.errors_truncated
+    assert not ImportReport().result().errors_truncated
+
+
+async def test_import_numbers_errors_by_input_row(monkeypatch):
+    batches = []
+
+    async def copy_batch(db_engine, batch):
+        batches.append(list(batch))
+
+    monkeypatch.setattr(importer, "copy_batch", copy_batch)
+    data = (
+        "title,description,price\n"
+        "Первое,,10\n"
+        "Пятое,,20\n"
+        "Второе,\"две\nстроки\",30\n"
+        "Третье,,не число\n"
+        f"{'x' * (importer.TITLE_MAX_LENGTH + 1)},,40\n"
+        "Четвёртое,,50\n"
+    ).encode()
+    result = await importer.import_ads(_chunks(data), "csv", author_id=7, batch_size=2, db_engine=None)
+    assert batches == [
+        [("Первое", None, 10.0, 7), ("Пятое", None, 20.0, 7)],
+        [("Второе", "две\nстроки", 30.0, 7), ("Четвёртое", None, 50.0, 7)],
+    ]
+    assert result.imported == 4
+    assert result.failed == 2
+    assert [error.row for error in result.errors] == [6, 7]
+    assert result.errors[0].error.startswith("price:")
+
+
+async def test_import_stops_on_unparseable_input(monkeypatch):
+    async def copy_batch(db_engine, batch):
+        raise AssertionError("nothing to copy")
+
+    monkeypatch.setattr(importer, "copy_batch", copy_batch)
+    result = await importer.import_ads(_chunks(b"title\nx\n"), "csv", author_id=1, db_engine=None)
+    assert result.imported == 0
+    assert [(error.row, error.error) for error in result.errors] == [(0, "CSV header has no columns: price")]
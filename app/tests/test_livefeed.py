@@ -0,0 +1,104 @@
+import asyncio
+import uuid
+import orjson
+import pytest
+from crud import AdvertisementCreate
+from db import async_session, engine
+import livefeed
+from livefeed import AdFeed
+from models import User
+import schemas
+
+pytestmark = pytest.mark.anyio
+
+
+def _ad(ad_id: int, price: float = 10.0, title: str = "Велосипед") -> dict:
+    return {"title": title, "description": None, "price": price, "id": ad_id, "author_id": 1}
+
+
+def _notify(feed: AdFeed, **message) -> None:
+    feed._on_notify(None, 0, "advertisement_changes", orjson.dumps(message).decode())
+
+
+def _drain(subscriber) -> list[dict]:
+    events = []
+    while not subscriber.queue.empty():
+        event = subscriber.queue.get_nowait()
+        events.append((event.op, orjson.loads(event.data)))
+    return events
+
+
+async def test_statement_with_ads_is_expanded_and_filtered():
+    feed = AdFeed()
+    cheap = feed.subscribe(max_price=50)
+    bikes = feed.subscribe(q="велосипед")
+    _notify(feed, op="insert", ads=[_ad(1, 10), _ad(2, 100, "Самокат")])
+    assert [(op, data["id"]) for op, data in _drain(cheap)] == [("insert", 1)]
+    assert [(op, data["ad"]["title"]) for op, data in _drain(bikes)] == [("insert", "Велосипед")]
+
+
+async def test_deletes_reach_every_subscriber():
+    feed = AdFeed()
+    subscriber = feed.subscribe(min_price=1000, q="x")
+    _notify(feed, op="delete", ids=[3, 4])
+    assert _drain(subscriber) == [("delete", {"op": "delete", "id": 3}), ("delete", {"op": "delete", "id": 4})]
+
+
+async def test_large_statement_is_one_bulk_event(monkeypatch):
+    monkeypatch.setattr(livefeed, "LIVE_FEED_BUFFER", 5)
+    feed = AdFeed()
+    subscriber = feed.subscribe(max_price=1)
+    ids = list(range(1, 501))
+    # Импорт или массовый запрос не должен переполнить очередь и отключить подписчика
+    _notify(feed, op="insert", ids=ids)
+    _notify(feed, op="delete", ids=ids)
+    _notify(feed, op="update", ads=[_ad(ad_id) for ad_id in range(1, livefeed.LIVE_FEED_BULK_THRESHOLD + 2)])
+    events = _drain(subscriber)
+    assert [op for op, _ in events] == ["bulk", "bulk", "bulk"]
+    assert events[0][1] == {"op": "insert", "ids": ids}
+    assert events[1][1]["op"] == "delete"
+    assert len(events[2][1]["ids"]) == livefeed.LIVE_FEED_BULK_THRESHOLD + 1
+    assert subscriber in feed.subscribers
+    assert feed.stats()["bulk_events"] == 3
+
+
+async def test_overflowing_subscriber_is_dropped(monkeypatch):
+    monkeypatch.setattr(livefeed, "LIVE_FEED_BUFFER", 2)
+    feed = AdFeed()
+    subscriber = feed.subscribe()
+    for ad_id in range(3):
+        _notify(feed, op="insert", ads=[_ad(ad_id)])
+    assert subscriber.overflowed
+    assert subscriber not in feed.subscribers
+    assert subscriber.queue.get_nowait() is None
+
+
+async def test_trigger_notifies_once_per_statement(postgres):
+    await engine.dispose()
+    feed = AdFeed()
+    subscriber = feed.subscribe()
+    listener = asyncio.create_task(feed.run())
+    try:
+        for _ in range(50):
+            if feed.connected:
+                break
+            await asyncio.sleep(0.1)
+        async with async_session() as db:
+            user = User(name=f"feed-{uuid.uuid4().hex[:12]}", password="-")
+            db.add(user)
+            await db.commit()
+            ad = await schemas.create_ad(db, AdvertisementCreate(title="single", price=1), user_id=user.id)
+            many = range(livefeed.LIVE_FEED_BULK_THRESHOLD + 1)
+            created = await schemas.bulk_create_ads(
+                db, [AdvertisementCreate(title=f"bulk {i}", price=i) for i in many], user_id=user.id
+            )
+            await schemas.bulk_delete_ads(db, [ad.id, *(item.id for item in created)], user_id=user.id)
+        events = [await asyncio.wait_for(subscriber.queue.get(), 5) for _ in range(3)]
+    finally:
+        listener.cancel()
+        await engine.dispose()
+    assert (events[0].op, orjson.loads(events[0].data)["id"]) == ("insert", ad.id)
+    assert (events[1].op, orjson.loads(events[1].data)["op"]) == ("bulk", "insert")
+    assert events[2].op == "bulk"
+    assert sorted(orjson.loads(events[2].data)["ids"]) == sorted([ad.id, *(item.id for item in created)])
+    assert subscriber.queue.empty()
@@ -0,0 +1,55 @@
+import time
+import pytest
+from ratelimit import MemoryBackend, RateLimitBackend, parse_limit
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_parse_limit():
+    assert parse_limit("10/60") == (10 / 60, 10.0)
+    assert parse_limit("") is None
+    assert parse_limit("0") is None
+
+
+async def test_burst_then_wait(clock):
+    backend = MemoryBackend()
+    rate, burst = 1.0, 3.0
+    assert [await backend.acquire("k", rate, burst) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert await backend.acquire("k", rate, burst) == pytest.approx(1.0)
+    clock[0] += 0.5
+    assert await backend.acquire("k", rate, burst) == pytest.approx(0.5)
+    clock[0] += 0.5
+    assert await backend.acquire("k", rate, burst) == 0.0
+
+
+async def test_refill_is_capped_by_burst(clock):
+    backend = MemoryBackend()
+    await backend.acquire("k", 1.0, 2.0)
+    clock[0] += 3600
+    assert [await backend.acquire("k", 1.0, 2.0) for _ in range(3)] == [0.0, 0.0, pytest.approx(1.0)]
+
+
+async def test_keys_are_independent_and_bounded(clock):
+    backend = MemoryBackend(maxsize=2)
+    assert await backend.acquire("a", 1.0, 1.0) == 0.0
+    assert await backend.acquire("b", 1.0, 1.0) == 0.0
+    assert await backend.acquire("a", 1.0, 1.0) > 0
+    # "b" вытеснен самым давним, его bucket начинается заново
+    await backend.acquire("c", 1.0, 1.0)
+    assert len(backend._buckets) == 2
+    assert await backend.acquire("b", 1.0, 1.0) == 0.0
+
+
+def test_backend_requires_acquire():
+    class Incomplete(RateLimitBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
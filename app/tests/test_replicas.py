@@ -0,0 +1,82 @@
+import time
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from starlette.requests import HTTPConnection
+from config import PG_DSN, READ_YOUR_WRITES_WINDOW
+from db import async_session
+import replicas
+from replicas import LAST_WRITE_COOKIE, Replica, ReadYourWritesMiddleware, in_write_window, read_sessionmaker
+
+
+def _conn(last_write=None) -> HTTPConnection:
+    headers = [] if last_write is None else [(b"cookie", f"{LAST_WRITE_COOKIE}={last_write}".encode())]
+    return HTTPConnection({"type": "http", "headers": headers})
+
+
+@pytest.mark.parametrize("last_write, expected", [
+    (None, False),
+    (time.time(), True),
+    (time.time() - READ_YOUR_WRITES_WINDOW - 1, False),
+    ("garbage", False),
+])
+def test_in_write_window(last_write, expected):
+    assert in_write_window(_conn(last_write)) is expected
+
+
+def test_read_sessionmaker_routing(monkeypatch):
+    first, second, down = (SimpleNamespace(healthy=healthy, session=object()) for healthy in (True, True, False))
+    monkeypatch.setattr(replicas, "replicas", [])
+    assert read_sessionmaker(_conn()) is async_session
+
+    monkeypatch.setattr(replicas, "replicas", [first, down, second])
+    # Нездоровая реплика пропускается, здоровые — по кругу
+    chosen = {read_sessionmaker(_conn()) for _ in range(4)}
+    assert chosen == {first.session, second.session}
+    # Клиент только что писал — читает с primary
+    assert read_sessionmaker(_conn(time.time())) is async_session
+
+    first.healthy = second.healthy = False
+    assert read_sessionmaker(_conn()) is async_session
+
+
+api = FastAPI()
+
+
+@api.get("/read")
+async def read():
+    return {}
+
+
+@api.post("/write")
+async def write(fail: bool = False):
+    if fail:
+        raise HTTPException(status_code=400)
+    return {}
+
+
+client = TestClient(ReadYourWritesMiddleware(api))
+
+
+def test_read_your_writes_cookie():
+    assert LAST_WRITE_COOKIE not in client.get("/read").cookies
+    assert LAST_WRITE_COOKIE not in client.post("/write", params={"fail": True}).cookies
+    response = client.post("/write")
+    assert time.time() - float(response.cookies[LAST_WRITE_COOKIE]) < READ_YOUR_WRITES_WINDOW
+    assert f"Max-Age={READ_YOUR_WRITES_WINDOW}" in response.headers["set-cookie"]
+
+
+@pytest.mark.anyio
+async def test_replica_health_check(postgres):
+    # primary не в режиме восстановления: отставания нет
+    replica = Replica(PG_DSN)
+    await replica.check()
+    assert replica.healthy and replica.lag == 0
+    await replica.engine.dispose()
+
+    missing = replica.engine.url.set(database="no_such_database")
+    unreachable = Replica(missing.render_as_string(hide_password=False))
+    await unreachable.check()
+    assert not unreachable.healthy and unreachable.lag is None
+    await unreachable.engine.dispose()
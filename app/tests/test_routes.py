@@ -0,0 +1,14 @@
+import pytest
+from routes import _etag_matches
+
+ETAG = '"42-3-0"'
+
+
+@pytest.mark.parametrize("if_none_match", ['"42-3-0"', 'W/"42-3-0"', '"1-1-0", W/"42-3-0"', "*", ' "42-3-0" '])
+def test_etag_matches(if_none_match):
+    assert _etag_matches(if_none_match, ETAG)
+
+
+@pytest.mark.parametrize("if_none_match", ['"42-3-1"', '"42-3-0', "42-3-0", 'W/"1-1-0", "2-2-0"'])
+def test_etag_does_not_match(if_none_match):
+    assert not _etag_matches(if_none_match, ETAG)
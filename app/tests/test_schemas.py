@@ -0,0 +1,150 @@
+import datetime
+import uuid
+from types import SimpleNamespace
+import orjson
+import pytest
+from sqlalchemy import func, select
+from crud import AdvertisementBulkUpdate, AdvertisementCreate
+from db import async_session, engine
+from models import User
+import schemas
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    schemas.ad_cache.clear()
+    yield
+    schemas.ad_cache.clear()
+
+
+def _ad(version: int, title: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=1, title=title, description=None, price=10.0, created_at=datetime.datetime(2026, 10, 18),
+        author_id=1, views=0, updated_at=None, version=version,
+    )
+
+
+def test_cache_ad_keeps_newer_version():
+    fresh = schemas._cache_ad(_ad(2, "new"))
+    # Чтение с реплики, начатое до обновления, завершилось позже него
+    assert schemas._cache_ad(_ad(1, "old")) is fresh
+    assert schemas.ad_cache.get(1) is fresh
+    assert b'"new"' in fresh.body
+    assert fresh.etag == '"1-2-0"'
+
+
+def test_cache_ad_replaces_older_version():
+    schemas._cache_ad(_ad(1, "old"))
+    assert schemas._cache_ad(_ad(2, "new")).version == 2
+    assert schemas.ad_cache.get(1).version == 2
+
+
+@pytest.mark.anyio
+async def test_changes_wait_for_open_transactions(postgres, monkeypatch):
+    monkeypatch.setattr(schemas, "ADS_CHANGES_SETTLE", 0)
+    await engine.dispose()
+    try:
+        async with async_session() as db:
+            user = User(name=f"feed-{uuid.uuid4().hex[:12]}", password="-")
+            db.add(user)
+            await db.commit()
+            started = await db.scalar(select(func.localtimestamp()))
+            await db.commit()
+            cursor = schemas.encode_changes_cursor(started, schemas.CHANGE_UPSERT, 0)
+            async with engine.connect() as long_running:
+                await long_running.execute(select(1))
+                ad = await schemas.create_ad(db, AdvertisementCreate(title="feed", price=1), user_id=user.id)
+                body, _ = await schemas.get_ad_changes(db, 500, cursor)
+                # Строки открытой транзакции могут появиться с updated_at раньше уже зафиксированных
+                assert ad.id not in {event["ad"]["id"] for event in orjson.loads(body)}
+                await long_running.rollback()
+            # pg_stat_activity читается один раз за транзакцию
+            await db.commit()
+            body, _ = await schemas.get_ad_changes(db, 500, cursor)
+            assert ad.id in {event["ad"]["id"] for event in orjson.loads(body)}
+            await schemas.delete_ad(db, ad.id, user_id=user.id)
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_stream_yields_one_chunk_per_partition(postgres):
+    await engine.dispose()
+    try:
+        async with async_session() as db:
+            user = User(name=f"stream-{uuid.uuid4().hex[:12]}", password="-")
+            db.add(user)
+            await db.commit()
+            ads = [await schemas.create_ad(db, AdvertisementCreate(title=f"s{i}", price=i), user_id=user.id)
+                   for i in range(5)]
+            chunks = [chunk async for chunk in schemas.stream_all_ads(limit=5, chunk_size=2)]
+            assert [chunk.count(b"\n") for chunk in chunks] == [2, 2, 1]
+            lines = b"".join(chunks).splitlines()
+            assert [orjson.loads(line)["id"] for line in lines] == [ad.id for ad in reversed(ads)]
+            for ad in ads:
+                await schemas.delete_ad(db, ad.id, user_id=user.id)
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_open_stream_does_not_hold_back_changes(postgres, monkeypatch):
+    monkeypatch.setattr(schemas, "ADS_CHANGES_SETTLE", 0)
+    await engine.dispose()
+    try:
+        async with async_session() as db:
+            user = User(name=f"feed-{uuid.uuid4().hex[:12]}", password="-")
+            db.add(user)
+            await db.commit()
+            started = await db.scalar(select(func.localtimestamp()))
+            await db.commit()
+            cursor = schemas.encode_changes_cursor(started, schemas.CHANGE_UPSERT, 0)
+            stream = schemas.stream_all_ads(limit=2, chunk_size=1)
+            # Первый кусок прочитан, транзакция потока остаётся открытой
+            assert await stream.__anext__()
+            ad = await schemas.create_ad(db, AdvertisementCreate(title="feed", price=1), user_id=user.id)
+            body, _ = await schemas.get_ad_changes(db, 500, cursor)
+            assert ad.id in {event["ad"]["id"] for event in orjson.loads(body)}
+            await stream.aclose()
+            await schemas.delete_ad(db, ad.id, user_id=user.id)
+    finally:
+        await engine.dispose()
+
+
+async def _user(db, prefix: str) -> User:
+    user = User(name=f"{prefix}-{uuid.uuid4().hex[:12]}", password="-")
+    db.add(user)
+    await db.commit()
+    return user
+
+
+@pytest.mark.anyio
+async def test_bulk_update_sets_only_given_fields(postgres):
+    await engine.dispose()
+    try:
+        async with async_session() as db:
+            owner, other = await _user(db, "bulk"), await _user(db, "bulk")
+            first = await schemas.create_ad(db, AdvertisementCreate(title="a", description="d", price=1), owner.id)
+            second = await schemas.create_ad(db, AdvertisementCreate(title="b", description="d", price=2), owner.id)
+            foreign = await schemas.create_ad(db, AdvertisementCreate(title="c", price=3), other.id)
+            updated = await schemas.bulk_update_ads(db, [
+                AdvertisementBulkUpdate(id=first.id, title="a2"),
+                # description=None явно — очистить; title=None не меняет NOT NULL-поле
+                AdvertisementBulkUpdate(id=second.id, title=None, description=None, price=20),
+                AdvertisementBulkUpdate(id=foreign.id, title="чужое"),
+                AdvertisementBulkUpdate(id=-1, title="нет такого"),
+            ], user_id=owner.id)
+            assert set(updated) == {first.id, second.id}
+            assert (updated[first.id].title, updated[first.id].description, updated[first.id].price) == ("a2", "d", 1)
+            assert (updated[second.id].title, updated[second.id].description, updated[second.id].price) == ("b", None, 20)
+            assert schemas.ad_cache.get(first.id).version == 2
+            rows = {row.id: row for row in (await db.execute(
+                select(schemas.Advertisement).where(schemas.Advertisement.id.in_([first.id, second.id, foreign.id]))
+            )).scalars()}
+            assert rows[foreign.id].title == "c" and rows[foreign.id].version == 1
+            assert rows[second.id].version == 2
+            assert await schemas.bulk_update_ads(db, [], user_id=owner.id) == {}
+            for ad, user in ((first, owner), (second, owner), (foreign, other)):
+                await schemas.delete_ad(db, ad.id, user_id=user.id)
+    finally:
+        await engine.dispose()
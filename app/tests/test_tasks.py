@@ -0,0 +1,30 @@
+import datetime
+import uuid
+import pytest
+from sqlalchemy import select
+from db import async_session, engine
+from models import Token, User
+import tasks
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_purge_expired_tokens_in_batches(postgres, monkeypatch):
+    monkeypatch.setattr(tasks, "TOKEN_PURGE_BATCH", 2)
+    monkeypatch.setattr(tasks, "TOKEN_PURGE_PAUSE", 0)
+    expired_at = datetime.datetime.utcnow() - datetime.timedelta(seconds=tasks.TOKEN_TTL + 60)
+    await engine.dispose()
+    try:
+        async with async_session() as db:
+            user = User(name=f"purge-{uuid.uuid4().hex[:12]}", password="-")
+            db.add(user)
+            await db.commit()
+            db.add_all([Token(user_id=user.id, creation_time=expired_at) for _ in range(5)])
+            db.add(Token(user_id=user.id))
+            await db.commit()
+            # Пять просроченных — три пачки по TOKEN_PURGE_BATCH
+            assert await tasks.purge_expired_tokens() >= 5
+            left = (await db.scalars(select(Token.creation_time).where(Token.user_id == user.id))).all()
+            assert len(left) == 1 and left[0] > expired_at
+    finally:
+        await engine.dispose()
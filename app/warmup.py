@@ -0,0 +1,76 @@
+import asyncio
+import datetime
+import logging
+import time
+import uuid
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+import hashing
+import schemas
+import statements
+from config import DB_POOL_SIZE, WARMUP_RETRY_INTERVAL
+from crud import AdvertisementResponse
+from db import async_session
+from replicas import check_replicas, replicas
+
+logger = logging.getLogger(__name__)
+
+
+def _hot_queries() -> list[tuple]:
+    """Горячие выражения с заведомо пустыми параметрами — их планы и prepared statements готовятся заранее."""
+    return [
+        (statements.AD_BY_ID, {"ad_id": 0}),
+        (statements.TOKEN_BY_VALUE, {"token": uuid.uuid4(), "since": datetime.datetime.utcnow()}),
+        (statements.access_rights(True, False, False), {"user_id": 0, "model": "advertisement"}),
+        (statements.access_rights(False, True, False), {"user_id": 0, "model": "advertisement"}),
+    ]
+
+
+async def _prime_connection(session_factory: async_sessionmaker[AsyncSession]) -> None:
+    async with session_factory() as session:
+        for stmt, params in _hot_queries():
+            (await session.execute(stmt, params)).all()
+        await schemas.get_all_ads(session, limit=1)
+
+
+async def warm_up_pools() -> None:
+    """
+    Открывает DB_POOL_SIZE соединений к primary и каждой реплике одновременно
+    и на каждом выполняет горячие запросы: у asyncpg кеш prepared statements свой у соединения.
+    """
+    await check_replicas()
+    factories = [async_session] + [replica.session for replica in replicas if replica.healthy]
+    await asyncio.gather(*(
+        _prime_connection(factory) for factory in factories for _ in range(DB_POOL_SIZE)
+    ))
+
+
+def warm_up_serializers(app: FastAPI) -> None:
+    """Первые вызовы Pydantic/orjson и сборка схемы OpenAPI."""
+    sample = {
+        "title": "warmup", "description": None, "price": 0.0, "id": 0,
+        "created_at": datetime.datetime.utcnow(), "author_id": 0, "views": 0,
+        "updated_at": datetime.datetime.utcnow(),
+    }
+    AdvertisementResponse.model_validate(sample).model_dump_json()
+    schemas.ads_json([tuple(sample.values())])
+    app.openapi()
+
+
+async def warm_up(app: FastAPI) -> None:
+    started = time.perf_counter()
+    warm_up_serializers(app)
+    await asyncio.gather(warm_up_pools(), hashing.warm_up())
+    logger.info("Warmup finished in %.0f ms", (time.perf_counter() - started) * 1000)
+
+
+async def warm_up_until_ready(app: FastAPI) -> None:
+    """Прогрев с повторами (например, пока БД недоступна); по окончании воркер готов принимать трафик."""
+    while True:
+        try:
+            await warm_up(app)
+            break
+        except Exception:
+            logger.exception("Warmup failed, retrying in %s s", WARMUP_RETRY_INTERVAL)
+            await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+    app.state.ready = True